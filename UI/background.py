@@ -0,0 +1,42 @@
+"""Run a blocking call (database query, file scan) on Qt's thread pool and get the result back as a signal"""
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from core import db_handler
+
+
+class _Signals(QObject):
+    done = Signal(object)
+    failed = Signal(str)
+
+
+class BackgroundCall(QRunnable):
+    """func(*args) on a QThreadPool thread; done(result) or failed(message) arrive on the GUI thread.
+
+    Keep a reference to the call until one of the signals arrives. The pool thread's
+    database connection is closed when func returns, since pool threads come and go.
+    """
+
+    def __init__(self, func, *args):
+        super().__init__()
+        # Obiectul Python rămâne proprietarul; pool-ul nu îl șterge după run()
+        self.setAutoDelete(False)
+        self.func = func
+        self.args = args
+        # Creat în firul interfeței, deci semnalele lui sunt livrate acolo
+        self.signals = _Signals()
+        self.done = self.signals.done
+        self.failed = self.signals.failed
+
+    def run(self):
+        try:
+            result = self.func(*self.args)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        finally:
+            db_handler.close_connection()
+        self.done.emit(result)
+
+    def start(self):
+        QThreadPool.globalInstance().start(self)
+        return self
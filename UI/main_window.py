@@ -1,17 +1,34 @@
 from PySide6.QtWidgets import (
     QMainWindow, QWidget, QTabWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QLabel, QMessageBox, QLineEdit, QFormLayout, QListWidget,
-    QProxyStyle, QStyle, QGridLayout, QScrollArea
+    QPushButton, QLabel, QMessageBox, QLineEdit, QFormLayout,
+    QProxyStyle, QStyle, QGridLayout, QScrollArea, QSpinBox
 )
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
+import contextlib
 import os
 import subprocess
 import sys
-import pandas as pd
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-from core import db_handler, pdf_generator, settings_handler
-from UI.table_window import InvoiceTableDialog
+# matplotlib, fpdf (prin UI.pdf_worker), UI.table_window și UI.pdf_list se importă abia când sunt folosite,
+# ca fereastra să apară cât mai repede
+from core import db_handler, settings_handler
+from core.charts import StatsCharts
+from UI.background import BackgroundCall
+
+# Câte redenumiri de numere duplicate se listează în mesajul de la pornire
+RENAMES_SHOWN = 20
+
+
+def _load_stats():
+    # Versiunea se citește prima: dacă baza se schimbă între timp, următoarea actualizare o prinde
+    version = db_handler.data_version()
+    stats = db_handler.get_invoice_stats()
+    if not stats:
+        raise RuntimeError("statistics query failed")
+    return version, stats, db_handler.get_product_stats(5)
+
+
+def _no_profile(name):
+    return contextlib.nullcontext()
 
 
 class ExpandingTabStyle(QProxyStyle):
@@ -24,11 +41,14 @@ class ExpandingTabStyle(QProxyStyle):
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, profile_step=None):
+        """profile_step(name) is a context manager timing a startup step (see main.py --profile-startup)"""
         super().__init__()
+        self._step = profile_step or _no_profile
         self.setWindowTitle("Invoice App - Database Edition")
         self.resize(900, 600)
-        db_handler.create_db()
+        with self._step("database"):
+            db_handler.create_db()
         self.tabs = QTabWidget()
         self.tabs.setTabPosition(QTabWidget.North)
         self.tabs.tabBar().setStyle(ExpandingTabStyle())
@@ -44,16 +64,53 @@ class MainWindow(QMainWindow):
         self.tabs.addTab(self.settingsPage, "Settings")
         self.tabs.addTab(self.aboutPage, "About Us")
         self.tabs.addTab(self.statsPage, "Statistics")
-        self._build_main_page()
-        self._build_about_page()
-        self._build_stats_page()
-        self._build_invoices_list_page()
-        self._build_settings_page()
-        self.tabs.currentChanged.connect(self.on_tab_changed)
         self.invoice_data = None
+        self._generation = None
+        self._stats_call = None
+        self._stats_pending = False
+        self._stats_version = None
+        # Doar tabul Main e vizibil la pornire; celelalte se construiesc la prima vizitare
+        self._page_builders = {
+            self.invoicesListPage: self._build_invoices_list_page,
+            self.settingsPage: self._build_settings_page,
+            self.aboutPage: self._build_about_page,
+            self.statsPage: self._build_stats_page,
+        }
+        with self._step("Main tab"):
+            self._build_main_page()
+        self.tabs.currentChanged.connect(self.on_tab_changed)
         self.current_settings = self.load_settings_from_file()
+        # După ce apare fereastra, ca mesajul să aibă un părinte vizibil
+        QTimer.singleShot(0, self._report_renamed_numbers)
+
+    def _report_renamed_numbers(self):
+        """Show, once, the duplicate invoice numbers the database upgrade made unique"""
+        renames = db_handler.get_unacknowledged_renames()
+        if not renames:
+            return
+        lines = [f"{rename.old_number or '(empty)'} → {rename.new_number}" for rename in renames[:RENAMES_SHOWN]]
+        if len(renames) > RENAMES_SHOWN:
+            lines.append(f"... and {len(renames) - RENAMES_SHOWN} more")
+        self._show_warning(f"{len(renames)} invoice number(s) were shared with an earlier invoice and have been "
+                           f"renamed so that every number is unique. New PDFs use the new numbers.\n\n"
+                           + "\n".join(lines))
+        db_handler.acknowledge_renames(rename.invoice_id for rename in renames)
+
+    def _ensure_page(self, page):
+        """Build a tab's contents if this is its first visit; returns True if it was built now"""
+        builder = self._page_builders.pop(page, None)
+        if builder is None:
+            return False
+        with self._step(f"{self.tabs.tabText(self.tabs.indexOf(page))} tab"):
+            builder()
+        return True
+
+    def _is_built(self, page):
+        return page not in self._page_builders
 
     def _build_stats_page(self):
+        from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
         scroll_area = QScrollArea()
         scroll_area.setWidgetResizable(True)
         scroll_area.setObjectName("statsScrollArea")
@@ -91,8 +148,13 @@ class MainWindow(QMainWindow):
         self.monthlyGrowthLabel.setObjectName("statCard")
         stats_grid.addWidget(self.monthlyGrowthLabel, 2, 0)
 
+        self.topProductsLabel = QLabel("Top 5 Products:\nNo data")
+        self.topProductsLabel.setObjectName("statCard")
+        stats_grid.addWidget(self.topProductsLabel, 2, 1)
+
         self.figure = Figure(figsize=(10, 9))
         self.canvas = FigureCanvas(self.figure)
+        self.charts = StatsCharts(self.figure)
         self.canvas.setObjectName("statsCanvas")
         layout.addWidget(self.canvas, stretch=1)
         layout.addLayout(stats_grid)
@@ -152,23 +214,26 @@ class MainWindow(QMainWindow):
         self.generateButton.clicked.connect(self.generate_pdfs)
 
     def _build_invoices_list_page(self):
+        from UI.pdf_list import PdfListPage
         layout = QVBoxLayout()
-        self.pdfList = QListWidget()
+        # Lista vine din indexul pdf_file, ținut la zi de generator și de un watcher pe director
+        self.pdfList = PdfListPage(self.invoicesListPage)
         layout.addWidget(self.pdfList)
         self.invoicesListPage.setLayout(layout)
-        self.load_pdfs()
-        self.pdfList.itemDoubleClicked.connect(self.open_pdf)
-
-    def load_pdfs(self):
-        self.pdfList.clear()
-        folder = "data/output_pdfs"
-        if os.path.exists(folder):
-            for file in os.listdir(folder):
-                if file.lower().endswith(".pdf"):
-                    self.pdfList.addItem(file)
-
-    def open_pdf(self, item):
-        filepath = os.path.abspath(os.path.join("data/output_pdfs", item.text()))
+        self.pdfList.openRequested.connect(self.open_pdf)
+        if self._generation is not None:
+            self.pdfList.set_generating(True)
+
+    def add_generated_pdf(self, file_path):
+        """Show a PDF in the Invoices tab as soon as the generator has written it"""
+        if self._is_built(self.invoicesListPage):
+            self.pdfList.file_added(file_path)
+
+    def _set_generating(self, running):
+        if self._is_built(self.invoicesListPage):
+            self.pdfList.set_generating(running)
+
+    def open_pdf(self, filepath):
         try:
             if sys.platform.startswith("linux"):
                 if "microsoft" in os.uname().release.lower():
@@ -213,6 +278,11 @@ class MainWindow(QMainWindow):
         layout.addRow("Oraș vânzător:", self.sellerCity)
         layout.addRow("Județ vânzător:", self.sellerCounty)
         layout.addRow("Țară vânzător:", self.sellerCountry)
+        self.pdfWorkers = QSpinBox()
+        self.pdfWorkers.setRange(0, os.cpu_count() or 1)
+        self.pdfWorkers.setSpecialValueText("Toate nucleele")
+        self.pdfWorkers.setValue(1)
+        layout.addRow("Procese generare PDF:", self.pdfWorkers)
         self.saveSettingsButton = QPushButton("Salvează setările")
         self.saveSettingsButton.setObjectName("saveSettingsButton")
         btn_container = QWidget()
@@ -227,6 +297,7 @@ class MainWindow(QMainWindow):
         self.load_settings_from_file()
 
     def show_new_invoice_table(self):
+        from UI.table_window import InvoiceTableDialog
         dialog = InvoiceTableDialog(self)
         if dialog.exec():
             if hasattr(dialog, 'saved_data') and dialog.saved_data is not None:
@@ -237,11 +308,13 @@ class MainWindow(QMainWindow):
 
     def load_from_database(self):
         try:
-            df = db_handler.get_all_invoices()
-            if df is not None and not df.empty:
-                dialog = InvoiceTableDialog(self, import_data=df)
+            rows_count = db_handler.count_invoices()
+            if rows_count:
+                from UI.table_window import InvoiceTableDialog
+                # Dialogul citește facturile pe pagini, pe măsură ce sunt afișate
+                dialog = InvoiceTableDialog(self, from_database=True)
+                dialog.pdfGenerated.connect(self.add_generated_pdf)
                 dialog.exec()
-                rows_count = len(df)
                 self.statusLabel.setText(f"✓ Loaded {rows_count} invoices from database")
             else:
                 self.statusLabel.setText("Database is empty")
@@ -250,32 +323,87 @@ class MainWindow(QMainWindow):
             self._show_error(f"Error loading invoices from database: {e}")
 
     def generate_pdfs(self):
-        if self.invoice_data is None or self.invoice_data.empty:
+        if not self.invoice_data:
             self._show_error("Please load invoices from database or create new ones first!")
             return
+        if self._generation is not None:
+            return
         try:
             user_settings = settings_handler.load_settings()
             if not user_settings.get('company', {}).get('name') or not user_settings.get('seller', {}):
                 self._show_warning("Settings are incomplete. Some seller fields may show 'Nu este setat'.")
             self.current_settings = user_settings
-            generated_files = pdf_generator.generate_all_invoices(self.invoice_data, user_settings)
-            if generated_files:
-                self._show_info(
-                    f"Successfully generated {len(generated_files)} PDF invoices!\n\n"
-                    f"Files saved to: data/output_pdfs/"
-                )
-                self.load_pdfs()
-                self.tabs.setCurrentWidget(self.invoicesListPage)
-                self.update_stats()
-            else:
-                self._show_error("No PDF files were generated. Please check your data.")
+            from UI.pdf_worker import PdfGenerationJob
+            # Generarea rulează pe un fir separat; fereastra rămâne responsivă și arată progresul
+            self._generation = PdfGenerationJob(self, self.invoice_data, user_settings, incremental=True)
+            self._generation.fileWritten.connect(self.add_generated_pdf)
+            self._generation.finished.connect(self._on_generation_finished)
+            self._generation.failed.connect(self._on_generation_failed)
+            self.generateButton.setEnabled(False)
+            self._set_generating(True)
+            self._generation.start()
         except Exception as e:
+            self._generation = None
             self._show_error(f"Error generating PDFs: {e}")
 
+    def _on_generation_finished(self, generated_files, cancelled):
+        self._generation = None
+        self.generateButton.setEnabled(True)
+        self._set_generating(False)
+        if cancelled:
+            self._show_info(f"PDF generation cancelled - {len(generated_files)} PDF invoices are ready.")
+        elif generated_files:
+            self._show_info(
+                f"Successfully generated {len(generated_files)} PDF invoices!\n\n"
+                f"Files saved to: data/output_pdfs/"
+            )
+        else:
+            self._show_error("No PDF files were generated. Please check your data.")
+            return
+        self.tabs.setCurrentWidget(self.invoicesListPage)
+        self.update_stats()
+
+    def _on_generation_failed(self, message):
+        self._generation = None
+        self.generateButton.setEnabled(True)
+        self._set_generating(False)
+        self._show_error(f"Error generating PDFs: {message}")
+
+    def closeEvent(self, event):
+        if self._generation is not None:
+            self._generation.wait()
+        super().closeEvent(event)
+
     def update_stats(self):
+        """Refresh the Statistics tab in the background, unless the database is unchanged since last time"""
+        if not self._is_built(self.statsPage):
+            return
+        if self._stats_call is not None:
+            self._stats_pending = True
+            return
+        try:
+            version = db_handler.data_version()
+        except Exception as e:
+            print(f"Error updating stats: {e}")
+            return
+        if version == self._stats_version:
+            return
+        self._stats_pending = False
+        self._stats_call = BackgroundCall(_load_stats)
+        self._stats_call.done.connect(self._show_stats)
+        self._stats_call.failed.connect(self._on_stats_failed)
+        self._stats_call.start()
+
+    def _on_stats_failed(self, message):
+        self._stats_call = None
+        print(f"Error updating stats: {message}")
+        if self._stats_pending:
+            self.update_stats()
+
+    def _show_stats(self, result):
+        self._stats_call = None
+        version, stats, top_products = result
         try:
-            stats = db_handler.get_invoice_stats()
-
             self.totalInvoicesLabel.setText(f"Total Invoices: {stats['total_count']}")
             self.totalAmountLabel.setText(
                 f"Total: {stats['total_with_vat']:.2f} RON\n"
@@ -292,56 +420,18 @@ class MainWindow(QMainWindow):
             self.monthlyGrowthLabel.setText(
                 "Monthly Growth:\n" + "\n".join([f"{m[0]}: {m[1]:.1f}%" for m in stats['monthly_growth']])
             )
-
-            self.figure.clear()
-
-            ax1 = self.figure.add_subplot(311)
-            months = [m[0] for m in stats['monthly_data']]
-            sums_no_vat = [m[1] for m in stats['monthly_data']]
-            sums_vat = [m[2] for m in stats['monthly_data']]
-            ax1.bar(months, sums_no_vat, label="Net", color="#8b5cf6")
-            ax1.bar(months, sums_vat, bottom=sums_no_vat, label="TVA", color="#a78bfa")
-            ax1.set_title("Invoice Amounts (Net + TVA)", color="#ffffff")
-            ax1.legend()
-            ax1.set_facecolor("#2a2a3d")
-            ax1.tick_params(axis='x', colors="#e0e0e0")
-            ax1.tick_params(axis='y', colors="#e0e0e0")
-            ax1.title.set_color("#e0e0e0")
-
-            ax2 = self.figure.add_subplot(312)
-            months_count = [m[0] for m in stats['monthly_count']]
-            counts = [m[1] for m in stats['monthly_count']]
-            ax2.plot(months_count, counts, marker='o', color="#22d3ee")
-            ax2.set_title("Invoices per Month", color="#ffffff")
-            ax2.set_ylabel("Count", color="#e0e0e0")
-            ax2.set_facecolor("#2a2a3d")
-            ax2.tick_params(axis='x', colors="#e0e0e0")
-            ax2.tick_params(axis='y', colors="#e0e0e0")
-
-            ax3 = self.figure.add_subplot(313)
-            months_avg = [m[0] for m in stats['monthly_avg']]
-            avgs = [m[1] for m in stats['monthly_avg']]
-            ax3.plot(months_avg, avgs, marker='o', color="#facc15")
-            ax3.set_title("Average Invoice Value per Month", color="#ffffff")
-            ax3.set_ylabel("Amount RON", color="#e0e0e0")
-            ax3.set_facecolor("#2a2a3d")
-            ax3.tick_params(axis='x', colors="#e0e0e0")
-            ax3.tick_params(axis='y', colors="#e0e0e0")
-
-            self.figure.patch.set_facecolor("#2a2a3d")
-            self.figure.subplots_adjust(hspace=0.4)
-
-            # 🔑 Rotește etichetele și ajustează layout-ul
-            for ax in [ax1, ax2, ax3]:
-                for label in ax.get_xticklabels():
-                    label.set_rotation(45)
-                    label.set_ha("right")
-
-            self.figure.tight_layout()
-            self.canvas.draw()
-
+            self.topProductsLabel.setText(
+                "Top 5 Products:\n" + "\n".join(
+                    [f"{p.name}: {p.net:.2f} (x{p.quantity:g})" for p in top_products])
+            )
+            # Graficele sunt create o singură dată; aici se schimbă doar datele lor
+            if self.charts.update(stats):
+                self.canvas.draw_idle()
+            self._stats_version = version
         except Exception as e:
             print(f"Error updating stats: {e}")
+        if self._stats_pending:
+            self.update_stats()
 
     def _show_warning(self, message):
         msg = QMessageBox(self)
@@ -377,6 +467,9 @@ class MainWindow(QMainWindow):
                 "city": self.sellerCity.text() or None,
                 "county": self.sellerCounty.text() or None,
                 "country": self.sellerCountry.text() or None,
+            },
+            "generation": {
+                "workers": self.pdfWorkers.value(),
             }
         }
         try:
@@ -391,7 +484,8 @@ class MainWindow(QMainWindow):
             loaded = settings_handler.load_settings()
             if not isinstance(loaded, dict):
                 loaded = {}
-            self.populate_settings_form(loaded)
+            if self._is_built(self.settingsPage):
+                self.populate_settings_form(loaded)
             return loaded
         except Exception as e:
             print(f"Error loading settings: {e}")
@@ -410,11 +504,14 @@ class MainWindow(QMainWindow):
         self.sellerLegalId.setText(g("seller", "legal_id") or "")
         self.sellerVAT.setText(g("seller", "vat") or "")
         self.sellerStreet.setText
+        workers = g("generation", "workers")
+        self.pdfWorkers.setValue(workers if isinstance(workers, int) else 1)
 
     def on_tab_changed(self, index: int):
+        # La prima vizită constructorul paginii încarcă deja setările; lista de PDF-uri se ține singură la zi
+        built = self._ensure_page(self.tabs.widget(index))
         if index == self.tabs.indexOf(self.settingsPage):
-            self.load_settings_from_file()
-        elif index == self.tabs.indexOf(self.invoicesListPage):
-            self.load_pdfs()
+            if not built:
+                self.load_settings_from_file()
         elif index == self.tabs.indexOf(self.statsPage):
             self.update_stats()
\ No newline at end of file
@@ -0,0 +1,246 @@
+"""The Invoices tab: generated PDFs listed from the pdf_file index, sorted and filtered in the database"""
+import os
+from collections import OrderedDict
+from datetime import datetime
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QFileSystemWatcher, QModelIndex, QTimer, Signal
+from PySide6.QtWidgets import QAbstractItemView, QHeaderView, QLabel, QLineEdit, QTableView, QVBoxLayout, QWidget
+
+import core.db_handler as db
+from core import pdf_index
+from UI.background import BackgroundCall
+
+# (coloană din pdf_file, titlu)
+COLUMNS = (
+    ("file_name", "File"),
+    ("invoice_number", "Invoice"),
+    ("buyer_name", "Buyer"),
+    ("issue_date", "Date"),
+    ("size", "Size"),
+    ("mtime_ns", "Modified"),
+)
+# Ca în UI.table_window: rânduri citite dintr-o dată și câte pagini se țin minte
+PAGE_ROWS = 200
+CACHED_PAGES = 25
+# Un lot de generare sau o copiere de fișiere produce zeci de notificări pe secundă:
+# sincronizarea și reîncărcarea listei pornesc după o scurtă pauză în notificări
+SYNC_DELAY_MS = 500
+REFRESH_DELAY_MS = 300
+
+
+def _format_size(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024 or unit == "MB":
+            return f"{size} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class PdfFileModel(QAbstractTableModel):
+    """The PDF index for a QTableView, read one page at a time as the view scrolls.
+
+    Paged like UI.table_window.InvoiceTableModel: at most CACHED_PAGES pages of
+    PAGE_ROWS rows are kept, and each page is one keyset query from the nearest
+    earlier page whose start is known. Sorting and the filter text are applied
+    by db.get_pdf_files_page, so every column sorts without reading the whole index.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.text = ""
+        self.order = "-mtime_ns"
+        self._count = 0
+        self._pages = OrderedDict()
+        self._page_keys = {0: None}
+        self.reload()
+
+    def reload(self):
+        """Forget the cached pages and re-count the rows (after the filter, order or index changed)"""
+        self.beginResetModel()
+        self._pages.clear()
+        self._page_keys = {0: None}
+        self._count = db.count_pdf_files(self.text or None)
+        self.endResetModel()
+
+    def set_filter(self, text):
+        """Show only the PDFs whose invoice number or buyer starts with text"""
+        text = text.strip()
+        if text != self.text:
+            self.text = text
+            self.reload()
+
+    def _page(self, number):
+        page = self._pages.get(number)
+        if page is not None:
+            self._pages.move_to_end(number)
+            return page
+        start = max(known for known in self._page_keys if known <= number)
+        result = db.get_pdf_files_page.__wrapped__(self.text or None, self.order, self._page_keys[start],
+                                                   PAGE_ROWS, (number - start) * PAGE_ROWS)
+        if result.next_key is not None:
+            self._page_keys[number + 1] = result.next_key
+        self._pages[number] = page = result.rows
+        while len(self._pages) > CACHED_PAGES:
+            self._pages.popitem(last=False)
+        return page
+
+    def pdf_file(self, row):
+        """The db.PdfFile shown on row, or None if the index has fewer rows than when counted"""
+        number, position = divmod(row, PAGE_ROWS)
+        page = self._page(number)
+        return page[position] if position < len(page) else None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        return COLUMNS[section][1] if orientation == Qt.Horizontal else str(section + 1)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = COLUMNS[index.column()][0]
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignRight | Qt.AlignVCenter if column == "size" else None
+        if role != Qt.DisplayRole:
+            return None
+        pdf_file = self.pdf_file(index.row())
+        if pdf_file is None:
+            return None
+        value = getattr(pdf_file, column)
+        if column == "size":
+            return _format_size(value)
+        if column == "mtime_ns":
+            return f"{datetime.fromtimestamp(value / 1e9):%Y-%m-%d %H:%M}"
+        return "" if value is None else str(value)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        order = ("-" if order == Qt.DescendingOrder else "") + COLUMNS[column][0]
+        if order != self.order:
+            self.order = order
+            self.reload()
+
+
+class PdfListPage(QWidget):
+    """Filter box and table of the generated PDFs, kept current without listing the directory.
+
+    The table shows the pdf_file index. A QFileSystemWatcher on the directory
+    triggers pdf_index.sync() on a pool thread, and the list is reloaded only if
+    the sync changed something. PDFs written by the application are already in
+    the index: file_added() just reloads the list. While set_generating(True) is
+    in effect the watcher is ignored and one sync runs when generation ends.
+    """
+    openRequested = Signal(str)  # calea absolută a PDF-ului ales
+
+    def __init__(self, parent=None, directory=pdf_index.OUTPUT_DIR):
+        super().__init__(parent)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._sync_call = None
+        self._sync_pending = False
+        self._generating = False
+
+        self.searchBox = QLineEdit()
+        self.searchBox.setPlaceholderText("Filter by invoice number or buyer...")
+        self.searchBox.setClearButtonEnabled(True)
+        self._filter_timer = QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(250)
+        self._filter_timer.timeout.connect(self.apply_filter)
+        self.searchBox.textChanged.connect(self._filter_timer.start)
+
+        self.model = PdfFileModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().hide()
+        # ResizeToContents ar citi sute de rânduri doar ca să măsoare coloanele
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Interactive)
+        header.setSectionResizeMode(0, QHeaderView.Stretch)
+        header.setSortIndicator(len(COLUMNS) - 1, Qt.DescendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.activated.connect(self._open)
+
+        self.countLabel = QLabel()
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.searchBox)
+        layout.addWidget(self.table)
+        layout.addWidget(self.countLabel)
+
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(REFRESH_DELAY_MS)
+        self._refresh_timer.timeout.connect(self.refresh)
+        self._sync_timer = QTimer(self)
+        self._sync_timer.setSingleShot(True)
+        self._sync_timer.setInterval(SYNC_DELAY_MS)
+        self._sync_timer.timeout.connect(self.sync)
+        self.watcher = QFileSystemWatcher([directory], self)
+        self.watcher.directoryChanged.connect(self._sync_timer.start)
+
+        self._update_count()
+        # Lista apare imediat din index; fișierele schimbate cât aplicația era închisă apar după sincronizare
+        self.sync()
+
+    def apply_filter(self):
+        self.model.set_filter(self.searchBox.text())
+        self._update_count()
+
+    def refresh(self):
+        """Reload the list from the index"""
+        self.model.reload()
+        self._update_count()
+
+    def _update_count(self):
+        count = self.model.rowCount()
+        suffix = " matching the filter" if self.model.text else ""
+        self.countLabel.setText(f"{count} PDF file{'' if count == 1 else 's'}{suffix}")
+
+    def file_added(self, file_path):
+        """A PDF the generator has written and indexed; the list is reloaded at most every REFRESH_DELAY_MS"""
+        # Fără repornire: fișierele vin la ~75 ms unul de altul și o repornire ar amâna reîncărcarea până la final
+        if not self._refresh_timer.isActive():
+            self._refresh_timer.start()
+
+    def set_generating(self, running):
+        self._generating = running
+        if not running:
+            self.refresh()
+            self.sync()
+
+    def sync(self):
+        """Update the index from the directory in the background, then reload the list if it changed"""
+        if self._generating:
+            return
+        if self._sync_call is not None:
+            self._sync_pending = True
+            return
+        self._sync_call = BackgroundCall(pdf_index.sync, self.directory)
+        self._sync_call.done.connect(self._on_synced)
+        self._sync_call.failed.connect(self._on_sync_failed)
+        self._sync_call.start()
+
+    def _on_synced(self, report):
+        self._sync_call = None
+        if any(report):
+            self.refresh()
+        if self._sync_pending:
+            self._sync_pending = False
+            self.sync()
+
+    def _on_sync_failed(self, message):
+        self._sync_call = None
+        self._sync_pending = False
+        self.countLabel.setText(f"{self.model.rowCount()} PDF files - could not scan {self.directory}: {message}")
+
+    def _open(self, index):
+        pdf_file = self.model.pdf_file(index.row())
+        if pdf_file is not None:
+            self.openRequested.emit(os.path.abspath(os.path.join(self.directory, pdf_file.file_name)))
@@ -0,0 +1,128 @@
+"""PDF generation on a background thread, with a progress dialog showing throughput and ETA"""
+import time
+
+from PySide6.QtCore import QObject, QThread, Qt, Signal
+from PySide6.QtWidgets import QProgressDialog
+
+from core import db_handler, pdf_generator
+
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+class _GenerationWorker(QObject):
+    """Runs pdf_generator.generate_all_invoices; lives on the job's thread"""
+    progress = Signal(int, int)
+    fileWritten = Signal(str)
+    finished = Signal(list)
+    failed = Signal(str)
+
+    def __init__(self, invoices, user_settings, cancel, **options):
+        super().__init__()
+        self.invoices = invoices
+        self.user_settings = user_settings
+        self.cancel = cancel
+        self.options = options
+
+    def run(self):
+        try:
+            files = pdf_generator.generate_all_invoices(self.invoices, self.user_settings, cancel=self.cancel,
+                                                        progress=self._report, **self.options)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        finally:
+            # Manifestul și indexul pdf_file au deschis conexiunea acestui fir; firul se termină odată cu lotul
+            db_handler.close_connection()
+        self.finished.emit(files)
+
+    def _report(self, done, total, result):
+        # Apelat din firul de lucru: semnalele ajung în firul interfeței prin coadă
+        if result.file_path:
+            self.fileWritten.emit(result.file_path)
+        self.progress.emit(done, total)
+
+
+class PdfGenerationJob(QObject):
+    """One batch of PDFs generated on a QThread while a QProgressDialog shows its progress.
+
+    Extra keyword arguments go to generate_all_invoices (incremental, workers, ...).
+    fileWritten is emitted for every PDF as soon as it is on disk, finished(files,
+    cancelled) once the batch ends and failed(message) if it stops with an error.
+    The Cancel button stops the batch before the next invoice.
+    """
+    fileWritten = Signal(str)
+    finished = Signal(list, bool)
+    failed = Signal(str)
+
+    def __init__(self, parent, invoices, user_settings=None, **options):
+        super().__init__(parent)
+        self.cancel_token = pdf_generator.CancellationToken()
+        self._started = None
+        self._thread = QThread(self)
+        self._worker = _GenerationWorker(invoices, user_settings, self.cancel_token, **options)
+        self._worker.moveToThread(self._thread)
+        self._thread.started.connect(self._worker.run)
+        self._worker.progress.connect(self._update_progress)
+        self._worker.fileWritten.connect(self.fileWritten)
+        self._worker.finished.connect(self._on_finished)
+        self._worker.failed.connect(self._on_failed)
+
+        self.dialog = QProgressDialog("Preparing invoices...", "Cancel", 0, 0, parent)
+        self.dialog.setWindowTitle("Generating PDFs")
+        self.dialog.setWindowModality(Qt.WindowModal)
+        self.dialog.setMinimumDuration(0)
+        self.dialog.setAutoClose(False)
+        self.dialog.setAutoReset(False)
+        # Token-ul e thread-safe, așa că îl setăm direct din firul interfeței;
+        # firul de lucru îl verifică înainte de fiecare factură
+        self.dialog.canceled.connect(self.cancel)
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+        self.dialog.show()
+
+    def cancel(self):
+        self.cancel_token.cancel()
+        self.dialog.setLabelText("Cancelling after the current invoice...")
+
+    def is_running(self):
+        return self._thread.isRunning()
+
+    def wait(self):
+        """Cancel and block until the thread has stopped (e.g. when the window closes)"""
+        self.cancel_token.cancel()
+        self._thread.quit()
+        self._thread.wait()
+
+    def _update_progress(self, done, total):
+        elapsed = time.perf_counter() - self._started
+        rate = done / elapsed if elapsed > 0 else 0
+        eta = (total - done) / rate if rate else 0
+        self.dialog.setMaximum(total)
+        self.dialog.setValue(done)
+        if not self.cancel_token.cancelled:
+            self.dialog.setLabelText(f"{done} / {total} invoices - {rate:.1f} invoices/s - "
+                                     f"about {_format_duration(eta)} left")
+
+    def _stop(self):
+        self._thread.quit()
+        self._thread.wait()
+        # close() emite și el canceled, care nu mai trebuie să marcheze lotul ca anulat
+        self.dialog.canceled.disconnect(self.cancel)
+        self.dialog.close()
+        self.dialog.deleteLater()
+        self.deleteLater()
+
+    def _on_finished(self, files):
+        cancelled = self.cancel_token.cancelled
+        self._stop()
+        self.finished.emit(files, cancelled)
+
+    def _on_failed(self, message):
+        self._stop()
+        self.failed.emit(message)
@@ -1,13 +1,23 @@
+from collections import OrderedDict
 from PySide6.QtWidgets import (
-    QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget,
-    QMessageBox, QHeaderView, QTableWidgetItem, QLabel, QItemDelegate, QAbstractItemView
+    QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, QTableView,
+    QMessageBox, QHeaderView, QTableWidgetItem, QLabel, QItemDelegate, QAbstractItemView, QLineEdit
 )
 from PySide6.QtGui import QFont, QColor, QKeySequence, QDoubleValidator, QShortcut
-from PySide6.QtCore import Qt
-import pandas as pd
+from PySide6.QtCore import Qt, QTimer, QAbstractTableModel, QModelIndex, Signal
 import core.db_handler as db
 import pyperclip
-from core import pdf_generator
+from core import settings_handler
+from core.invoice_record import FIELDS, Invoice, UI_COLUMNS, clean_number, clean_text, invoices_from
+from UI.pdf_worker import PdfGenerationJob
+
+
+SEARCH_RESULTS = 500
+REQUIRED_COLUMNS = ["Număr factură", "Data emiterii", "Nume cumpărător"]
+INVALID_COLOR = QColor(255, 200, 200)
+# Rânduri citite dintr-o dată din baza de date și câte astfel de pagini țin minte (maxim 5000 de facturi)
+PAGE_ROWS = 200
+CACHED_PAGES = 25
 
 
 class DoubleDelegate(QItemDelegate):
@@ -19,8 +29,128 @@ class DoubleDelegate(QItemDelegate):
         return editor
 
 
+class InvoiceTableModel(QAbstractTableModel):
+    """Invoices for a QTableView, read from the database one page at a time as the view scrolls.
+
+    Only the pages the view asks for are fetched and at most CACHED_PAGES of them
+    are kept, least recently used dropped first. A page is read with keyset
+    pagination from the nearest earlier page whose start is known, so scrolling
+    is one indexed query per PAGE_ROWS rows. Edits are written immediately with
+    db.update_invoice by id. set_invoices() shows a fixed list instead (search results).
+    """
+    edited = Signal(int, int, object)  # rând, coloană, valoarea veche
+    editFailed = Signal(str)
+
+    def __init__(self, parent=None, headers=None):
+        super().__init__(parent)
+        self.headers = headers or list(UI_COLUMNS)
+        self.filters = None
+        self.order = "-issue_date"
+        self._invoices = None  # listă fixă de Invoice, sau None = pagini din baza de date
+        self._count = 0
+        self._pages = OrderedDict()
+        self._page_keys = {0: None}  # pagină -> after_key de la care începe
+        self.reload()
+
+    def reload(self):
+        """Forget the cached pages and re-count the rows (after filters, order or data change)"""
+        self.beginResetModel()
+        self._pages.clear()
+        self._page_keys = {0: None}
+        self._count = len(self._invoices) if self._invoices is not None else db.count_invoices(self.filters)
+        self.endResetModel()
+
+    def set_invoices(self, invoices):
+        """Show a fixed list of invoices, or page through the database again with None"""
+        self._invoices = None if invoices is None else list(invoices)
+        self.reload()
+
+    def _page(self, number):
+        page = self._pages.get(number)
+        if page is not None:
+            self._pages.move_to_end(number)
+            return page
+        start = max(known for known in self._page_keys if known <= number)
+        # Fără cache-ul din db_handler: paginile sunt deja ținute aici
+        result = db.get_invoices_page.__wrapped__(self.filters, self.order, self._page_keys[start],
+                                                  PAGE_ROWS, (number - start) * PAGE_ROWS)
+        if result.next_key is not None:
+            self._page_keys[number + 1] = result.next_key
+        self._pages[number] = page = result.rows
+        while len(self._pages) > CACHED_PAGES:
+            self._pages.popitem(last=False)
+        return page
+
+    def invoice(self, row):
+        """The Invoice shown on row, or None if the database has fewer rows than when counted"""
+        if self._invoices is not None:
+            return self._invoices[row]
+        number, position = divmod(row, PAGE_ROWS)
+        page = self._page(number)
+        return page[position] if position < len(page) else None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(FIELDS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        return self.headers[section] if orientation == Qt.Horizontal else str(section + 1)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole, Qt.BackgroundRole):
+            return None
+        invoice = self.invoice(index.row())
+        if invoice is None:
+            return None
+        attr, label, _ = FIELDS[index.column()]
+        value = getattr(invoice, attr)
+        if role == Qt.BackgroundRole:
+            return INVALID_COLOR if value is None and label in REQUIRED_COLUMNS else None
+        return "" if value is None else str(value)
+
+    def flags(self, index):
+        return super().flags(index) | Qt.ItemIsEditable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid():
+            return False
+        invoice = self.invoice(index.row())
+        if invoice is None or invoice.id is None:
+            return False
+        attr, _, kind = FIELDS[index.column()]
+        old_value = getattr(invoice, attr)
+        new_value = clean_number(value) if kind is float else clean_text(value)
+        if new_value == old_value:
+            return False
+        try:
+            db.update_invoice(invoice.id, {attr: new_value})
+        except Exception as e:
+            self.editFailed.emit(f"Could not update invoice {invoice.text('invoice_number')}: {e}")
+            return False
+        setattr(invoice, attr, new_value)
+        if attr == "invoice_lines":
+            invoice.products = None
+        self.dataChanged.emit(index, index)
+        self.edited.emit(index.row(), index.column(), "" if old_value is None else str(old_value))
+        return True
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Doar coloanele cu index în ordinea (coloană, id) se pot ordona fără să citim tot tabelul
+        attr = FIELDS[column][0]
+        if self._invoices is not None or attr not in db.ORDER_COLUMNS:
+            return
+        self.order = ("-" if order == Qt.DescendingOrder else "") + attr
+        self.reload()
+
+
 class InvoiceTableDialog(QDialog):
-    def __init__(self, parent=None, import_data=None):
+    pdfGenerated = Signal(str)  # calea fiecărui PDF, imediat ce a fost scris
+
+    def __init__(self, parent=None, import_data=None, from_database=False):
         super().__init__(parent)
         self.setWindowTitle("Invoice Table - Database Edition")
         self.resize(1200, 700)
@@ -36,32 +166,41 @@ class InvoiceTableDialog(QDialog):
         self._last_col = None
         self._tracking = False
 
-        self.columns = [
-            "Număr factură", "Data emiterii", "Tip factură", "Monedă", "Nume cumpărător",
-            "ID legal cumpărător", "ID TVA cumpărător", "Stradă cumpărător", "Oraș cumpărător",
-            "Județ cumpărător", "Cod poștal cumpărător", "Țară cumpărător",
-            "Termeni plată", "Linii factură (produse)",
-            "Valoare totală fără TVA", "Total TVA", "Total plată"
-        ]
+        self.columns = list(UI_COLUMNS)
+        headers = [f"{col} *" if col in REQUIRED_COLUMNS else col for col in self.columns]
+        # Facturile existente se afișează printr-un model (citit pe pagini din baza de date);
+        # facturile noi se introduc într-un QTableWidget obișnuit
+        self.model = None
+        browsing = import_data is not None or from_database
 
         layout = QVBoxLayout(self)
 
-        info_text = (
-            f"Loaded {len(import_data)} invoices from database"
-            if import_data is not None
-            else "Creating new invoices - data will be saved to database"
-        )
-        self.info_label = QLabel(info_text)
+        self.info_label = QLabel("Creating new invoices - data will be saved to database")
         layout.addWidget(self.info_label)
 
-        self.table = QTableWidget(
-            max(100, len(import_data) + 20) if import_data is not None else 100,
-            len(self.columns)
-        )
-        self.table.setHorizontalHeaderLabels([
-            f"{col} *" if col in ["Număr factură", "Data emiterii", "Nume cumpărător"] else col
-            for col in self.columns
-        ])
+        if browsing:
+            self.searchBox = QLineEdit()
+            self.searchBox.setPlaceholderText("Search by invoice number, buyer, address or product...")
+            self.searchBox.setClearButtonEnabled(True)
+            # Căutarea pornește după o scurtă pauză în tastare, nu la fiecare tastă
+            self._search_timer = QTimer(self)
+            self._search_timer.setSingleShot(True)
+            self._search_timer.setInterval(250)
+            self._search_timer.timeout.connect(self.run_search)
+            self.searchBox.textChanged.connect(self._search_timer.start)
+            layout.addWidget(self.searchBox)
+
+            self.model = InvoiceTableModel(self, headers)
+            self.model.edited.connect(self.record_edit)
+            self.model.editFailed.connect(lambda message: QMessageBox.warning(self, "Update Failed", message))
+            self.table = QTableView()
+            self.table.setModel(self.model)
+            for col, (_, _, kind) in enumerate(FIELDS):
+                if kind is float:
+                    self.table.setItemDelegateForColumn(col, DoubleDelegate(self.table))
+        else:
+            self.table = QTableWidget(100, len(self.columns))
+            self.table.setHorizontalHeaderLabels(headers)
 
         header_font = QFont()
         header_font.setBold(True)
@@ -71,23 +210,31 @@ class InvoiceTableDialog(QDialog):
         header.setSectionResizeMode(QHeaderView.ResizeToContents)
 
         self.table.setStyleSheet("""
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #5e548e;
                 color: white;
             }
         """)
 
-        if import_data is not None:
+        if browsing:
+            # Lățimea coloanelor se calculează doar din rândurile vizibile, nu din toată baza de date
+            header.setResizeContentsPrecision(0)
             self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
             self.table.setSelectionMode(QAbstractItemView.MultiSelection)
-            self.populate_table_with_data(import_data)
+            header.setSortIndicator(self.columns.index("Data emiterii"), Qt.DescendingOrder)
+            self.table.setSortingEnabled(True)
+            if import_data is not None:
+                self.populate_table_with_data(import_data)
+            else:
+                self.info_label.setText(
+                    f"{self.model.rowCount()} invoices in database - select rows and generate PDFs, "
+                    f"edits are saved immediately")
         else:
             self.table.setSelectionBehavior(QAbstractItemView.SelectItems)
             self.table.setSelectionMode(QAbstractItemView.ExtendedSelection)
-
-        self.table.cellActivated.connect(self.store_old_value)
-        self.table.cellClicked.connect(self.store_old_value)
-        self.table.itemChanged.connect(self.track_changes)
+            self.table.cellActivated.connect(self.store_old_value)
+            self.table.cellClicked.connect(self.store_old_value)
+            self.table.itemChanged.connect(self.track_changes)
         layout.addWidget(self.table)
 
         undo_shortcut = QShortcut(QKeySequence("Ctrl+Z"), self)
@@ -100,7 +247,7 @@ class InvoiceTableDialog(QDialog):
         delete_shortcut.activated.connect(self.delete_selected_cells)
 
         button_layout = QHBoxLayout()
-        if import_data is not None:
+        if browsing:
             self.generateSelectedBtn = QPushButton("Generate Selected Invoices to PDFs")
             self.generateSelectedBtn.clicked.connect(self.generate_selected_pdfs)
             buttons = [self.generateSelectedBtn]
@@ -140,10 +287,19 @@ class InvoiceTableDialog(QDialog):
                 self.undo_stack.append((item.row(), item.column(), self._last_value))
         self._last_value, self._last_row, self._last_col = None, None, None
 
+    def record_edit(self, row, col, old_value):
+        if not self._tracking:
+            self.undo_stack.append((row, col, old_value))
+
     def undo_last_edit(self):
         if not self.undo_stack:
             return
         row, col, old_value = self.undo_stack.pop()
+        if self.model is not None:
+            self._tracking = True
+            self.model.setData(self.model.index(row, col), old_value)
+            self._tracking = False
+            return
         item = self.table.item(row, col)
         if not item:
             item = QTableWidgetItem()
@@ -156,6 +312,12 @@ class InvoiceTableDialog(QDialog):
         self.table.selectAll()
 
     def delete_selected_cells(self):
+        if self.model is not None:
+            # Rândurile întregi sunt selectate, iar modificările se salvează imediat: golim doar celula curentă
+            current = self.table.currentIndex()
+            if current.isValid():
+                self.model.setData(current, "")
+            return
         selected_items = self.table.selectedItems()
         if not selected_items:
             return
@@ -169,43 +331,64 @@ class InvoiceTableDialog(QDialog):
     def paste_from_clipboard(self):
         clipboard_text = pyperclip.paste()
         rows = clipboard_text.split("\n")
-        current_row, current_col = self.table.currentRow(), self.table.currentColumn()
+        current = self.table.currentIndex()
+        current_row, current_col = current.row(), current.column()
         for r, row_data in enumerate(rows):
             if not row_data.strip():
                 continue
             cols = row_data.split("\t")
             for c, col_data in enumerate(cols):
+                if self.model is not None:
+                    index = self.model.index(current_row + r, current_col + c)
+                    if index.isValid():
+                        self.model.setData(index, col_data.strip())
+                    continue
                 item = QTableWidgetItem(col_data.strip())
                 self.table.setItem(current_row + r, current_col + c, item)
 
     def populate_table_with_data(self, data):
-        if len(data) > self.table.rowCount():
-            self.table.setRowCount(len(data) + 20)
-        for row_idx, (_, row_data) in enumerate(data.iterrows()):
-            for col_idx, column_name in enumerate(self.columns):
-                value = str(row_data[column_name]) if column_name in row_data and pd.notna(row_data[column_name]) else ""
-                self.table.setItem(row_idx, col_idx, QTableWidgetItem(value))
-        self.info_label.setText(f"Loaded {len(data)} invoices from database - select rows and generate PDFs")
+        invoices = invoices_from(data)
+        self.model.set_invoices(invoices)
+        self.info_label.setText(f"Loaded {len(invoices)} invoices from database - select rows and generate PDFs")
+
+    def run_search(self):
+        query = self.searchBox.text().strip()
+        try:
+            # Fără text revenim la paginarea întregii baze de date
+            invoices = db.search_invoices(query, SEARCH_RESULTS) if query else None
+        except Exception as e:
+            QMessageBox.warning(self, "Search", f"Search failed: {e}")
+            return
+        self.undo_stack.clear()
+        self.table.clearSelection()
+        self.model.set_invoices(invoices)
+        if query:
+            self.info_label.setText(f"{len(invoices)} invoices match \"{query}\" - select rows and generate PDFs")
+        else:
+            self.info_label.setText(f"{self.model.rowCount()} invoices in database - select rows and generate PDFs")
+
+    def _row_invoice(self, row):
+        first = self.table.item(row, 0)
+        values = {"id": first.data(Qt.UserRole) if first else None}
+        for col, column_name in enumerate(self.columns):
+            item = self.table.item(row, col)
+            values[column_name] = item.text() if item else ""
+        return Invoice.from_dict(values)
 
     def get_selected_invoices(self):
-        selected_rows = self.table.selectionModel().selectedRows()
-        data = []
-        for row in selected_rows:
-            row_data = []
-            for col in range(self.table.columnCount()):
-                item = self.table.item(row.row(), col)
-                row_data.append(item.text() if item else "")
-            data.append(row_data)
-        if data:
-            return pd.DataFrame(data, columns=self.columns)
-        return None
+        selected_rows = sorted(index.row() for index in self.table.selectionModel().selectedRows())
+        if self.model is not None:
+            invoices = [invoice for invoice in map(self.model.invoice, selected_rows) if invoice is not None]
+            # Liniile de produs vin din invoice_line, câte o interogare pentru un lot de facturi
+            return db.attach_invoice_lines(invoices)
+        return [self._row_invoice(row) for row in selected_rows]
 
     def generate_selected_pdfs(self):
-        df = self.get_selected_invoices()
-        if df is None or df.empty:
+        invoices = self.get_selected_invoices()
+        if not invoices:
             QMessageBox.warning(self, "No Selection", "Please select at least one invoice.")
             return
-        errors = self.validate_invoice_data(df)
+        errors = self.validate_invoice_data(invoices)
         if errors:
             msg = "Validation warnings:\n\n" + "\n".join(errors[:5])
             if len(errors) > 5:
@@ -214,26 +397,43 @@ class InvoiceTableDialog(QDialog):
             reply = QMessageBox.question(self, "Validation", msg, QMessageBox.Yes | QMessageBox.No)
             if reply == QMessageBox.No:
                 return
-        for _, row in df.iterrows():
-            pdf_generator.generate_invoice_from_dict(row.to_dict())
-        QMessageBox.information(self, "Success", f"Generated PDFs for {len(df)} selected invoices.")
+        self.generateSelectedBtn.setEnabled(False)
+        job = PdfGenerationJob(self, invoices, settings_handler.load_settings())
+        job.fileWritten.connect(self.pdfGenerated)
+        job.finished.connect(self._on_generation_finished)
+        job.failed.connect(self._on_generation_failed)
+        job.start()
+
+    def _on_generation_finished(self, generated_files, cancelled):
+        self.generateSelectedBtn.setEnabled(True)
+        if cancelled:
+            QMessageBox.information(self, "Cancelled", f"Generated {len(generated_files)} PDFs before cancelling.")
+            return
+        QMessageBox.information(self, "Success", f"Generated {len(generated_files)} PDFs for the selected invoices.")
         self.accept()
 
-    def validate_invoice_data(self, df):
+    def _on_generation_failed(self, message):
+        self.generateSelectedBtn.setEnabled(True)
+        QMessageBox.critical(self, "Error", f"Error generating PDFs: {message}")
+
+    def validate_invoice_data(self, invoices):
         errors = []
         invalid_cells = []
-        for idx, row in df.iterrows():
-            invoice_num = row.get("Număr factură", "")
-            if not invoice_num.strip():
+        for idx, invoice in enumerate(invoices):
+            invoice_num = invoice.invoice_number
+            if not invoice_num:
                 errors.append(f"Row {idx + 1}: Missing invoice number")
                 invalid_cells.append((idx, self.columns.index("Număr factură")))
                 continue
-            if not row.get("Data emiterii", "").strip():
+            if not invoice.issue_date:
                 errors.append(f"Invoice {invoice_num}: Missing issue date")
                 invalid_cells.append((idx, self.columns.index("Data emiterii")))
-            if not row.get("Nume cumpărător", "").strip():
+            if not invoice.buyer_name:
                 errors.append(f"Invoice {invoice_num}: Missing buyer name")
                 invalid_cells.append((idx, self.columns.index("Nume cumpărător")))
+        if self.model is not None:
+            # Modelul colorează singur câmpurile obligatorii goale
+            return errors
         for row, col in invalid_cells:
             item = self.table.item(row, col)
             if item:
@@ -241,24 +441,27 @@ class InvoiceTableDialog(QDialog):
         return errors
 
     def save_to_database(self):
-        rows, cols = self.table.rowCount(), self.table.columnCount()
-        data = []
-        for row in range(rows):
-            row_data = []
-            is_empty = True
-            for col in range(cols):
-                item = self.table.item(row, col)
-                value = item.text() if item else ""
-                if value.strip():
-                    is_empty = False
-                row_data.append(value)
-            if not is_empty:
-                data.append(row_data)
-        if data:
-            df = pd.DataFrame(data, columns=self.columns)
-            for _, row in df.iterrows():
-                db.insert_invoice(row.to_dict())
-            QMessageBox.information(self, "Success", f"{len(df)} invoices saved to database.")
+        # (rândul din tabel, factura); rândurile goale sunt sărite, deci pozițiile din
+        # report.failed se traduc înapoi în rânduri prin această listă
+        rows = []
+        for row in range(self.table.rowCount()):
+            invoice = self._row_invoice(row)
+            if any(value is not None for value in invoice.values()):
+                rows.append((row, invoice))
+        invoices = [invoice for _, invoice in rows]
+        if invoices:
+            report = db.insert_invoices(invoices)
+            if report.failed:
+                failed_rows = {position for position, _ in report.failed}
+                msg = "\n".join(f"Row {rows[position][0] + 1}: {error}" for position, error in report.failed[:5])
+                if len(report.failed) > 5:
+                    msg += f"\n\n...and {len(report.failed) - 5} more"
+                QMessageBox.warning(self, "Partial Save",
+                                    f"{report.inserted} invoices saved, {len(report.failed)} rejected:\n\n{msg}")
+                invoices = [invoice for position, invoice in enumerate(invoices) if position not in failed_rows]
+            else:
+                QMessageBox.information(self, "Success", f"{report.inserted} invoices saved to database.")
+            self.saved_data = invoices
             self.accept()
         else:
             QMessageBox.warning(self, "No Data", "No data to save.")
@@ -0,0 +1,87 @@
+"""Charts of the Statistics tab, drawn once on a matplotlib Figure and then updated in place"""
+import math
+
+BACKGROUND = "#2a2a3d"
+TEXT_COLOR = "#e0e0e0"
+NET_COLOR = "#8b5cf6"
+VAT_COLOR = "#a78bfa"
+COUNT_COLOR = "#22d3ee"
+AVERAGE_COLOR = "#facc15"
+
+
+def _number(value):
+    # Lunile fără plăți au media NULL; matplotlib lasă un gol în linie pentru NaN
+    return math.nan if value is None else value
+
+
+class StatsCharts:
+    """Monthly amounts (stacked Net + TVA bars), invoices per month and average invoice value.
+
+    Axes, titles, colours and the two lines are created once. update(stats) only
+    changes the data of the existing artists; the bars are rebuilt, and the layout
+    recomputed, only when the set of months changes. It returns False when the data
+    is the same as last time, so the caller can skip the redraw.
+    """
+
+    def __init__(self, figure):
+        self.figure = figure
+        figure.patch.set_facecolor(BACKGROUND)
+        self.amounts_ax, self.count_ax, self.average_ax = figure.subplots(3, 1)
+        titles = ("Invoice Amounts (Net + TVA)", "Invoices per Month", "Average Invoice Value per Month")
+        for ax, title in zip(self.axes, titles):
+            ax.set_title(title, color=TEXT_COLOR)
+            ax.set_facecolor(BACKGROUND)
+            ax.tick_params(axis='x', colors=TEXT_COLOR)
+            ax.tick_params(axis='y', colors=TEXT_COLOR)
+        self.count_ax.set_ylabel("Count", color=TEXT_COLOR)
+        self.average_ax.set_ylabel("Amount RON", color=TEXT_COLOR)
+        self.count_line, = self.count_ax.plot([], [], marker='o', color=COUNT_COLOR)
+        self.average_line, = self.average_ax.plot([], [], marker='o', color=AVERAGE_COLOR)
+        self.net_bars = self.vat_bars = None
+        self._months = None
+        self._data = None
+
+    @property
+    def axes(self):
+        return self.amounts_ax, self.count_ax, self.average_ax
+
+    def update(self, stats):
+        """Show the monthly series of get_invoice_stats(); returns True if the figure needs a redraw"""
+        data = (stats['monthly_data'], stats['monthly_count'], stats['monthly_avg'])
+        if data == self._data:
+            return False
+        self._data = data
+        months = [m[0] for m in stats['monthly_data']]
+        net = [m[1] for m in stats['monthly_data']]
+        vat = [m[2] for m in stats['monthly_data']]
+        positions = range(len(months))
+        if months != self._months:
+            self._rebuild_bars(months, net, vat)
+        else:
+            for bar, height in zip(self.net_bars, net):
+                bar.set_height(height)
+            for bar, bottom, height in zip(self.vat_bars, net, vat):
+                bar.set_y(bottom)
+                bar.set_height(height)
+        # Seriile lunare vin din același tabel de sumar, deci au aceleași luni ca barele
+        self.count_line.set_data(positions, [m[1] for m in stats['monthly_count']])
+        self.average_line.set_data(positions, [_number(m[1]) for m in stats['monthly_avg']])
+        for ax in self.axes:
+            ax.relim()
+            ax.autoscale_view()
+        if months != self._months:
+            self._months = months
+            self.figure.tight_layout()
+        return True
+
+    def _rebuild_bars(self, months, net, vat):
+        for bars in (self.net_bars, self.vat_bars):
+            if bars is not None:
+                bars.remove()
+        positions = range(len(months))
+        self.net_bars = self.amounts_ax.bar(positions, net, label="Net", color=NET_COLOR)
+        self.vat_bars = self.amounts_ax.bar(positions, vat, bottom=net, label="TVA", color=VAT_COLOR)
+        self.amounts_ax.legend()
+        for ax in self.axes:
+            ax.set_xticks(positions)
+            ax.set_xticklabels(months, rotation=45, ha="right")
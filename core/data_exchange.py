@@ -0,0 +1,206 @@
+"""Chunked export and import of the invoices database as Parquet or Arrow IPC files.
+
+An export writes two files with fixed, typed schemas (INVOICE_SCHEMA and
+LINE_SCHEMA) to a directory: invoices.<ext> and invoice_lines.<ext>, both ordered
+by invoice id. Rows are streamed from SQLite CHUNK_SIZE at a time, so memory use
+does not grow with the size of the database; an import reads the files back the
+same way. Ids are kept, so the files can be joined on invoices.id = invoice_lines.invoice_id.
+
+    python -m core.data_exchange export data/export --format parquet
+    python -m core.data_exchange import data/export
+"""
+import os
+from collections import namedtuple
+
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+
+from core import db_handler
+from core.invoice_record import FIELDS, Invoice, iter_product_lines, product_line
+
+CHUNK_SIZE = 50_000
+SCHEMA_VERSION = "1"
+# format -> extensia fișierelor
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+INVOICES_FILE = "invoices"
+LINES_FILE = "invoice_lines"
+
+_ARROW_TYPES = {str: pa.string(), float: pa.float64()}
+_REQUIRED = ("invoice_number", "issue_date")
+INVOICE_SCHEMA = pa.schema(
+    [pa.field("id", pa.int64(), nullable=False)]
+    + [pa.field(attr, _ARROW_TYPES[kind], nullable=attr not in _REQUIRED) for attr, _, kind in FIELDS],
+    metadata={"invoice_app.table": "invoices", "invoice_app.schema_version": SCHEMA_VERSION},
+)
+LINE_SCHEMA = pa.schema(
+    [
+        pa.field("invoice_id", pa.int64(), nullable=False),
+        pa.field("position", pa.int32(), nullable=False),
+        pa.field("product_name", pa.string(), nullable=False),
+        pa.field("quantity", pa.float64(), nullable=False),
+        pa.field("unit_price", pa.float64(), nullable=False),
+        pa.field("vat_rate", pa.float64(), nullable=False),
+    ],
+    metadata={"invoice_app.table": "invoice_line", "invoice_app.schema_version": SCHEMA_VERSION},
+)
+
+# paths = (fișierul facturilor, fișierul liniilor)
+ExportReport = namedtuple("ExportReport", "invoices lines paths")
+# failed = [(poziția facturii în fișier, eroare)], ca în db_handler.InsertReport
+ImportReport = namedtuple("ImportReport", "invoices lines failed")
+
+
+def export_paths(directory, format="parquet"):
+    if format not in FORMATS:
+        raise ValueError(f"Unknown export format {format!r}; use one of {', '.join(FORMATS)}")
+    return tuple(os.path.join(directory, name + FORMATS[format]) for name in (INVOICES_FILE, LINES_FILE))
+
+
+class _Writer:
+    """Append record batches to a Parquet file (one row group per batch) or an Arrow IPC file"""
+
+    def __init__(self, path, schema, format):
+        self.schema = schema
+        if format == "parquet":
+            self._writer = pq.ParquetWriter(path, schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_file(path, schema)
+
+    def write_rows(self, rows):
+        columns = [pa.array(column, type=field.type) for column, field in zip(zip(*rows), self.schema)]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def _stream(cursor, chunk_size):
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield rows
+
+
+def _copy_table(conn, sql, path, schema, format, chunk_size):
+    writer = _Writer(path, schema, format)
+    count = 0
+    try:
+        for rows in _stream(conn.execute(sql), chunk_size):
+            writer.write_rows(rows)
+            count += len(rows)
+    finally:
+        writer.close()
+    return count
+
+
+def export_database(directory, format="parquet", chunk_size=CHUNK_SIZE):
+    """Write every invoice and product line to directory; returns ExportReport.
+
+    Both tables are read in one transaction, so the two files describe the same
+    state of the database even if another process writes in the meantime.
+    """
+    paths = export_paths(directory, format)
+    os.makedirs(directory, exist_ok=True)
+    conn = db_handler.get_connection()
+    invoice_sql = f"SELECT {', '.join(field.name for field in INVOICE_SCHEMA)} FROM invoices ORDER BY id"
+    line_sql = (f"SELECT {', '.join(field.name for field in LINE_SCHEMA)} FROM invoice_line "
+                f"ORDER BY invoice_id, position")
+    conn.execute("BEGIN")
+    try:
+        invoices = _copy_table(conn, invoice_sql, paths[0], INVOICE_SCHEMA, format, chunk_size)
+        lines = _copy_table(conn, line_sql, paths[1], LINE_SCHEMA, format, chunk_size)
+    finally:
+        conn.rollback()
+    return ExportReport(invoices, lines, paths)
+
+
+def _read_batches(path, schema, chunk_size):
+    """Yield the file's rows as lists of dicts, at most chunk_size at a time"""
+    if path.endswith(FORMATS["parquet"]):
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=schema.names)
+    else:
+        # Fișierul e mapat în memorie: un batch se citește doar când e folosit
+        reader = pa.ipc.open_file(pa.memory_map(path))
+        batches = (reader.get_batch(i).select(schema.names) for i in range(reader.num_record_batches))
+    for batch in batches:
+        for start in range(0, batch.num_rows, chunk_size):
+            yield batch.slice(start, chunk_size).to_pylist()
+
+
+def _lines_by_invoice(path, chunk_size):
+    """Yield (invoice_id, [product, ...]) in invoice id order from a lines file"""
+    current_id, products = None, []
+    for rows in _read_batches(path, LINE_SCHEMA, chunk_size):
+        for row in rows:
+            if row["invoice_id"] != current_id:
+                if current_id is not None:
+                    if row["invoice_id"] < current_id:
+                        raise ValueError(f"{path} is not ordered by invoice_id; export it with export_database")
+                    yield current_id, products
+                current_id, products = row["invoice_id"], []
+            products.append(product_line(row["product_name"], row["quantity"], row["unit_price"], row["vat_rate"]))
+    if current_id is not None:
+        yield current_id, products
+
+
+def import_database(directory, chunk_size=CHUNK_SIZE):
+    """Load the files written by export_database into DB_PATH; returns ImportReport.
+
+    Invoices keep their ids; one whose id or number is already in the database is
+    reported in ImportReport.failed and skipped along with its lines. The lines
+    file is merged with the invoices chunk by chunk (both are ordered by invoice
+    id), so only one chunk of each is in memory. Without a lines file the lines
+    are parsed from the invoice_lines text.
+    """
+    for format in FORMATS:
+        invoices_path, lines_path = export_paths(directory, format)
+        if os.path.exists(invoices_path):
+            break
+    else:
+        raise FileNotFoundError(f"No {INVOICES_FILE}.parquet or {INVOICES_FILE}.arrow in {directory}")
+    lines = _lines_by_invoice(lines_path, chunk_size) if os.path.exists(lines_path) else None
+    pending = next(lines, None) if lines is not None else None
+    imported = written_lines = 0
+    failed = []
+    offset = 0
+    last_id = None
+    for rows in _read_batches(invoices_path, INVOICE_SCHEMA, chunk_size):
+        invoices = [Invoice(**row) for row in rows]
+        if lines is not None:
+            by_id = {invoice.id: invoice for invoice in invoices}
+            for invoice in invoices:
+                if last_id is not None and invoice.id <= last_id:
+                    raise ValueError(f"{invoices_path} is not ordered by id; export it with export_database")
+                last_id = invoice.id
+                invoice.products = []
+            # Liniile facturilor din acest chunk; cele fără factură sunt ignorate
+            while pending is not None and pending[0] <= last_id:
+                if pending[0] in by_id:
+                    by_id[pending[0]].products = pending[1]
+                pending = next(lines, None)
+        result = db_handler.insert_invoices(invoices, batch_size=chunk_size, keep_ids=True)
+        rejected = {position for position, _ in result.failed}
+        imported += result.inserted
+        written_lines += sum(len(list(iter_product_lines(invoice)))
+                             for position, invoice in enumerate(invoices) if position not in rejected)
+        failed.extend((offset + position, error) for position, error in result.failed)
+        offset += len(rows)
+    return ImportReport(imported, written_lines, failed)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Export or import the invoices database as Parquet / Arrow files")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("directory")
+    parser.add_argument("--format", choices=tuple(FORMATS), default="parquet", help="export file format")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows read / written at a time")
+    args = parser.parse_args()
+    if args.command == "export":
+        result = export_database(args.directory, args.format, args.chunk_size)
+        print(f"✅ Exported {result.invoices} invoices and {result.lines} lines to {', '.join(result.paths)}")
+    else:
+        result = import_database(args.directory, args.chunk_size)
+        print(f"✅ Imported {result.invoices} invoices and {result.lines} lines ({len(result.failed)} rejected)")
@@ -1,55 +1,248 @@
 import sqlite3
 import os
-import pandas as pd
+import re
+import atexit
+import functools
+import threading
+from collections import namedtuple, OrderedDict
 import time
 
+from core import migrations
+from core.invoice_record import FIELDS, Invoice, format_product_lines, iter_product_lines, product_line
+
 # Define the database path relative to the project structure
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "..", "data", "invoices.db")
 
-def create_db():
-    """Create the invoices database with all necessary tables"""
+# Setări aplicate fiecărei conexiuni noi. WAL permite citiri în paralel cu o scriere,
+# iar cu synchronous=NORMAL un commit nu mai face fsync (doar checkpoint-ul îl face).
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",  # KiB, ~16 MB per conexiune
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
+BUSY_TIMEOUT = 5  # secunde de așteptare când baza de date e blocată de alt proces
+
+INSERT_BATCH_SIZE = 1000
+
+# Rezultatul unui insert_invoices: câte rânduri au fost salvate și [(poziție, eroare)] pentru cele respinse
+InsertReport = namedtuple("InsertReport", "inserted failed")
+# O pagină din get_invoices_page: rows = listă de Invoice, next_key = after_key pentru pagina următoare
+InvoicePage = namedtuple("InvoicePage", "rows next_key")
+# Un rând din get_product_stats; net / vat / total sunt sume peste toate liniile produsului
+ProductStats = namedtuple("ProductStats", "name quantity net vat total invoice_count")
+# Un număr de factură duplicat, schimbat când invoice_number a devenit unic (vezi core.migrations)
+NumberRename = namedtuple("NumberRename", "invoice_id old_number new_number")
+# Un PDF din indexul pdf_file; size în octeți, mtime_ns ca în os.stat
+PdfFile = namedtuple("PdfFile", "id file_name invoice_number buyer_name issue_date size mtime_ns")
+
+# Câte id-uri de facturi intră într-un "IN (...)" când se citesc liniile de produs
+LINE_QUERY_BATCH = 500
+
+PAGE_SIZE = 500
+# Coloane după care se poate ordona: fiecare are un index în ordinea (coloană, id)
+ORDER_COLUMNS = ("id", "issue_date", "invoice_number", "buyer_name")
+NULLABLE_ORDER_COLUMNS = ("buyer_name",)
+# filtru -> condiție SQL
+INVOICE_FILTERS = {
+    "date_from": "issue_date >= ?",
+    "date_to": "issue_date <= ?",
+    "buyer": "buyer_name = ?",
+    "currency": "currency = ?",
+    "invoice_type": "invoice_type = ?",
+}
+_INVOICE_COLUMNS = ("id",) + tuple(attr for attr, _, _ in FIELDS)
+_SELECT_INVOICE = f"SELECT {', '.join(_INVOICE_COLUMNS)} FROM invoices"
+
+# Coloane după care se poate ordona lista de PDF-uri; fiecare are propriul index
+PDF_ORDER_COLUMNS = ("id", "file_name", "invoice_number", "buyer_name", "issue_date", "size", "mtime_ns")
+PDF_NULLABLE_ORDER_COLUMNS = ("invoice_number", "buyer_name", "issue_date")
+_SELECT_PDF_FILE = f"SELECT {', '.join(PdfFile._fields)} FROM pdf_file"
+# Valorile None din metadate nu suprascriu ce știe deja indexul (ex. un fișier regenerat din afara aplicației)
+_RECORD_PDF_FILE_SQL = """
+    INSERT INTO pdf_file (file_name, invoice_number, buyer_name, issue_date, size, mtime_ns)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (file_name) DO UPDATE SET
+        invoice_number = IFNULL(excluded.invoice_number, invoice_number),
+        buyer_name = IFNULL(excluded.buyer_name, buyer_name),
+        issue_date = IFNULL(excluded.issue_date, issue_date),
+        size = excluded.size,
+        mtime_ns = excluded.mtime_ns
+"""
+
+SEARCH_LIMIT = 100
+# Câte potriviri (cele mai noi) sunt ordonate după relevanță; pentru termeni foarte comuni
+# calculul bm25 pe toate potrivirile ar dura sute de ms la un milion de facturi
+SEARCH_CANDIDATES = 5000
+# Ponderi bm25 pe coloanele din migrations.FTS_COLUMNS: numărul facturii și cumpărătorul contează cel mai mult
+SEARCH_WEIGHTS = (10.0, 5.0, 2.0, 1.0, 1.0, 1.0, 1.0)
+_SEARCH_SQL = f"""
+    SELECT i.id, {', '.join('i.' + attr for attr, _, _ in FIELDS)}
+    FROM (SELECT rowid, bm25(invoices_fts, {', '.join(map(str, SEARCH_WEIGHTS))}) AS score
+          FROM invoices_fts WHERE invoices_fts MATCH ? ORDER BY rowid DESC LIMIT ?) AS matches
+    JOIN invoices AS i ON i.id = matches.rowid
+    ORDER BY matches.score, i.id DESC LIMIT ?
+"""
+
+# Câte rezultate de interogări păstrează cache-ul (LRU)
+QUERY_CACHE_SIZE = 128
+
+_local = threading.local()
+_pool_lock = threading.Lock()
+_pool = set()
+# Căile bazelor de date migrate deja în acest proces
+_migrated = set()
+
+_cache_lock = threading.Lock()
+_query_cache = OrderedDict()
+_write_count = 0
+# (cale, conexiune) folosită doar pentru PRAGMA data_version; nu scrie niciodată, deci
+# valoarea se schimbă la orice commit făcut de altă conexiune, din acest proces sau din altul
+_version_conn = None
+
+
+def get_connection():
+    """Return this thread's connection to DB_PATH, opening and configuring it on first use.
+
+    The first connection to a database in this process also brings its schema up
+    to date (see core.migrations), so the handle returned is always ready to use.
+    Connections are kept open for the life of the thread and reused by every
+    function in this module. Use `with conn:` around writes to get one transaction.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == DB_PATH:
+        return conn
+    if conn is not None:
+        _discard(conn)
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    with _pool_lock:
+        if DB_PATH not in _migrated:
+            try:
+                migrations.migrate(conn)
+            except (sqlite3.Error, RuntimeError):
+                conn.close()
+                raise
+            _migrated.add(DB_PATH)
+    _local.conn, _local.path = conn, DB_PATH
+    with _pool_lock:
+        _pool.add(conn)
+    return conn
+
+
+def _discard(conn):
+    with _pool_lock:
+        _pool.discard(conn)
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS invoices (p
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            invoice_number TEXT NOT NULL,
-            issue_date TEXT NOT NULL,
-            invoice_type TEXT,
-            currency TEXT,
-            buyer_name TEXT,
-            buyer_legal_id TEXT,
-            buyer_vat_id TEXT,
-            buyer_street TEXT,
-            buyer_city TEXT,
-            buyer_county TEXT,
-            buyer_postal_code TEXT,
-            buyer_country TEXT,
-            payment_terms TEXT,
-            invoice_lines TEXT,
-            total_no_vat REAL,
-            total_vat REAL,
-            total_payment REAL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-        conn.commit()
-    except sqlite3.Error as e:
-        print(f"Error creating database: {e}")
-        raise
-    finally:
         conn.close()
+    except sqlite3.ProgrammingError:
+        # conexiunea aparține altui fir de execuție; o închide garbage collector-ul
+        pass
+    if getattr(_local, "conn", None) is conn:
+        _local.conn = None
+
+
+def close_connection():
+    """Close the calling thread's pooled connection (call it when a worker thread ends)"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _discard(conn)
+
+
+def close_all_connections():
+    global _version_conn
+    with _cache_lock:
+        if _version_conn is not None:
+            _version_conn[1].close()
+            _version_conn = None
+    with _pool_lock:
+        connections = list(_pool)
+        _pool.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            pass
+    _local.conn = None
+
+
+atexit.register(close_all_connections)
+
+
+def _data_version():
+    """A value that changes whenever anything commits to DB_PATH; call with _cache_lock held"""
+    global _version_conn
+    if _version_conn is None or _version_conn[0] != DB_PATH:
+        if _version_conn is not None:
+            _version_conn[1].close()
+        _version_conn = (DB_PATH, sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT, check_same_thread=False))
+    return DB_PATH, _version_conn[1].execute("PRAGMA data_version").fetchone()[0], _write_count
+
+
+def data_version():
+    """Opaque value that changes whenever the database changes; compare it to skip needless refreshes"""
+    with _cache_lock:
+        return _data_version()
+
+
+def _note_write():
+    global _write_count
+    with _cache_lock:
+        _write_count += 1
+
+
+def clear_query_cache():
+    with _cache_lock:
+        _query_cache.clear()
+
+
+def _cached(keep=None):
+    """Cache a read-only query function's results, keyed by its arguments.
+
+    An entry is reused only while the database is unchanged: PRAGMA data_version
+    catches commits from other connections and processes, and the write counter
+    those made through this module. Results are shared between callers, so treat
+    them as read-only. keep(result) can refuse to cache a result (e.g. an error value).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__name__, repr(args), repr(sorted(kwargs.items())))
+            with _cache_lock:
+                # Versiunea se citește înainte de interogare: un commit făcut între timp
+                # doar invalidează intrarea, nu poate lăsa în cache date vechi
+                version = _data_version()
+                entry = _query_cache.get(key)
+                if entry is not None and entry[0] == version:
+                    _query_cache.move_to_end(key)
+                    return entry[1]
+            result = func(*args, **kwargs)
+            if keep is None or keep(result):
+                with _cache_lock:
+                    _query_cache[key] = (version, result)
+                    _query_cache.move_to_end(key)
+                    while len(_query_cache) > QUERY_CACHE_SIZE:
+                        _query_cache.popitem(last=False)
+            return result
+        return wrapper
+    return decorator
+
+
+def create_db():
+    """Create the database or upgrade its schema to the current version"""
+    get_connection()
+
 
 def insert_invoice(data: dict):
     """Insert a new invoice into the database with retry logic"""
-    create_db()  # Ensure database exists
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            conn = sqlite3.connect(DB_PATH)
+            conn = get_connection()
             c = conn.cursor()
             
             # Map Romanian column names to database column names
@@ -84,9 +277,10 @@ def insert_invoice(data: dict):
             columns = ', '.join(mapped_data.keys())
             placeholders = ', '.join('?' for _ in mapped_data)
             sql = f"INSERT INTO invoices ({columns}) VALUES ({placeholders})"
-            c.execute(sql, tuple(mapped_data.values()))
-            conn.commit()
-            conn.close()
+            with conn:
+                c.execute(sql, tuple(mapped_data.values()))
+                _write_lines(conn, [(c.lastrowid, mapped_data.get("invoice_lines"))])
+            _note_write()
             return
         except sqlite3.OperationalError as e:
             if "database is locked" in str(e) and attempt < max_retries - 1:
@@ -97,61 +291,307 @@ def insert_invoice(data: dict):
         except Exception as e:
             print(f"Unexpected error inserting invoice: {e}")
             raise
-        finally:
-            if 'conn' in locals():
-                conn.close()
 
-def get_all_invoices():
-    """Get all invoices from database as DataFrame with Romanian column names"""
-    create_db()  # Ensure database exists
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        
-        # Map database columns to Romanian names for UI consistency
-        reverse_mapping = {
-            "invoice_number": "Număr factură",
-            "issue_date": "Data emiterii",
-            "invoice_type": "Tip factură",
-            "currency": "Monedă",
-            "buyer_name": "Nume cumpărător",
-            "buyer_legal_id": "ID legal cumpărător",
-            "buyer_vat_id": "ID TVA cumpărător",
-            "buyer_street": "Stradă cumpărător",
-            "buyer_city": "Oraș cumpărător",
-            "buyer_county": "Județ cumpărător",
-            "buyer_postal_code": "Cod poștal cumpărător",
-            "buyer_country": "Țară cumpărător",
-            "payment_terms": "Termeni plată",
-            "invoice_lines": "Linii factură (produse)",
-            "total_no_vat": "Valoare totală fără TVA",
-            "total_vat": "Total TVA",
-            "total_payment": "Total plată"
-        }
-        
-        df = pd.read_sql_query("SELECT * FROM invoices ORDER BY issue_date DESC", conn)
-        conn.close()
-        
-        if df.empty:
-            return None
-            
-        # Rename columns to Romanian for UI consistency
-        df = df.rename(columns=reverse_mapping)
-        
-        # Drop internal columns that shouldn't be shown in UI
-        columns_to_drop = ['id', 'created_at']
-        df = df.drop(columns=[col for col in columns_to_drop if col in df.columns])
-        
-        return df
-    except Exception as e:
-        print(f"Error fetching invoices: {e}")
-        if 'conn' in locals():
-            conn.close()
-        return None
+
+def _insert_row(invoice):
+    row = invoice.to_db_dict()
+    # Ensure required fields are not None
+    for key in ['invoice_number', 'issue_date']:
+        if not row.get(key):
+            row[key] = ""
+    return tuple(row.values())
+
+
+_INSERT_SQL = (f"INSERT INTO invoices ({', '.join(attr for attr, _, _ in FIELDS)}) "
+               f"VALUES ({', '.join('?' for _ in FIELDS)})")
+_INSERT_WITH_ID_SQL = (f"INSERT INTO invoices (id, {', '.join(attr for attr, _, _ in FIELDS)}) "
+                       f"VALUES (?, {', '.join('?' for _ in FIELDS)})")
+
+_INSERT_LINE_SQL = ("INSERT INTO invoice_line (invoice_id, position, product_name, quantity, unit_price, vat_rate) "
+                    "VALUES (?, ?, ?, ?, ?, ?)")
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _write_lines(conn, items, replace=False):
+    """Write the invoice_line rows of (invoice_id, lines) pairs, inside the caller's transaction.
+
+    lines is the invoice_lines text or a list of products; with replace=True the
+    invoices' existing lines are deleted first.
+    """
+    rows = []
+    for invoice_id, lines in items:
+        if replace:
+            conn.execute("DELETE FROM invoice_line WHERE invoice_id = ?", (invoice_id,))
+        products = lines if isinstance(lines, (list, tuple)) else iter_product_lines(lines)
+        for position, product in enumerate(products):
+            if isinstance(product, dict):
+                product = (product["name"], product["quantity"], product["unit_price"], product["vat_rate"])
+            rows.append((invoice_id, position) + tuple(product))
+    conn.executemany(_INSERT_LINE_SQL, rows)
+    return len(rows)
+
+
+def _ids_by_number(conn, numbers):
+    ids = {}
+    for chunk in _chunks(numbers, LINE_QUERY_BATCH):
+        sql = f"SELECT invoice_number, id FROM invoices WHERE invoice_number IN ({', '.join('?' for _ in chunk)})"
+        ids.update(conn.execute(sql, chunk))
+    return ids
+
+
+def insert_invoices(rows, batch_size=INSERT_BATCH_SIZE, keep_ids=False):
+    """Insert many invoices (Invoice objects, or dicts with Romanian or database keys).
+
+    Rows are written with executemany, one transaction per batch. A batch that fails
+    is retried row by row, so a bad row is reported in InsertReport.failed with its
+    position instead of aborting the others. keep_ids=True writes each Invoice's id
+    (an id already in use is a failed row); otherwise new ids are assigned. An
+    Invoice with products set gets those lines, otherwise they are parsed from invoice_lines.
+    """
+    conn = get_connection()
+    sql = _INSERT_WITH_ID_SQL if keep_ids else _INSERT_SQL
+    inserted = 0
+    failed = []
+    # (poziție, valori, număr factură, produse sau text)
+    batch = []
+
+    def flush():
+        nonlocal inserted
+        try:
+            with conn:
+                conn.executemany(sql, [values for _, values, _, _ in batch])
+                # executemany nu întoarce id-urile; numărul facturii e unic, deci le găsim după el
+                ids = _ids_by_number(conn, [number for _, _, number, _ in batch])
+                _write_lines(conn, [(ids[number], lines) for _, _, number, lines in batch])
+            inserted += len(batch)
+        except sqlite3.DatabaseError:
+            for position, values, _, lines in batch:
+                try:
+                    with conn:
+                        cursor = conn.execute(sql, values)
+                        _write_lines(conn, [(cursor.lastrowid, lines)])
+                    inserted += 1
+                except sqlite3.DatabaseError as e:
+                    failed.append((position, str(e)))
+        batch.clear()
+
+    for position, row in enumerate(rows):
+        try:
+            invoice = Invoice.coerce(row)
+            values = _insert_row(invoice)
+            if keep_ids:
+                values = (invoice.id,) + values
+            lines = invoice.products if invoice.products is not None else invoice.invoice_lines
+            batch.append((position, values, invoice.invoice_number or "", lines))
+        except (TypeError, ValueError) as e:
+            failed.append((position, str(e)))
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    if inserted:
+        _note_write()
+    for position, error in failed:
+        print(f"Error inserting invoice at row {position + 1}: {error}")
+    return InsertReport(inserted, failed)
+
+
+def load_invoice_lines(items, batch_size=INSERT_BATCH_SIZE):
+    """Bulk-replace the product lines of existing invoices; returns the number of lines written.
+
+    items are (invoice_id, lines) pairs, where lines is a list of product dicts or
+    (name, quantity, unit_price, vat_rate) tuples, or the "name|qty|price|vat;..."
+    text. Each invoice's invoice_lines text is rewritten to match. One transaction
+    per batch_size invoices.
+    """
+    conn = get_connection()
+    written = 0
+    changed = False
+    for chunk in _chunks(items, batch_size):
+        chunk = [(invoice_id, lines if isinstance(lines, (list, tuple)) else list(iter_product_lines(lines)))
+                 for invoice_id, lines in chunk]
+        with conn:
+            conn.executemany("UPDATE invoices SET invoice_lines = ? WHERE id = ?",
+                             [(format_product_lines(products) or None, invoice_id) for invoice_id, products in chunk])
+            written += _write_lines(conn, chunk, replace=True)
+        changed = True
+    if changed:
+        _note_write()
+    return written
+
+
+def get_invoice_lines(invoice_ids):
+    """{invoice_id: [product, ...]} for the given invoices, products in their original order.
+
+    Products are dicts as produced by invoice_record.product_line. Reads
+    LINE_QUERY_BATCH invoices per query through idx_invoice_line_invoice.
+    Invoices without lines are missing from the result.
+    """
+    conn = get_connection()
+    lines = {}
+    for chunk in _chunks(dict.fromkeys(invoice_ids), LINE_QUERY_BATCH):
+        sql = (f"SELECT invoice_id, product_name, quantity, unit_price, vat_rate FROM invoice_line "
+               f"WHERE invoice_id IN ({', '.join('?' for _ in chunk)}) ORDER BY invoice_id, position")
+        for invoice_id, *product in conn.execute(sql, chunk):
+            lines.setdefault(invoice_id, []).append(product_line(*product))
+    return lines
+
+
+def attach_invoice_lines(invoices):
+    """Fill invoice.products from invoice_line for the invoices that have an id; returns invoices"""
+    lines = get_invoice_lines(invoice.id for invoice in invoices if invoice.id is not None)
+    for invoice in invoices:
+        if invoice.id is not None:
+            invoice.products = lines.get(invoice.id, [])
+    return invoices
+
+
+def _invoice_from_row(row):
+    return Invoice(row[0], **{attr: value for (attr, _, _), value in zip(FIELDS, row[1:])})
+
+
+def _parse_order(order, columns=ORDER_COLUMNS):
+    column = order.lstrip("-")
+    if column not in columns:
+        raise ValueError(f"Cannot order by {order!r}; use one of {', '.join(columns)}")
+    return column, order.startswith("-")
+
+
+def _keyset_condition(column, descending, after_key, nullable=NULLABLE_ORDER_COLUMNS):
+    """WHERE fragment selecting the rows that come after after_key = (value, id) in this order"""
+    value, last_id = after_key
+    if column == "id":
+        return ("id < ?" if descending else "id > ?"), [last_id]
+    op = "<" if descending else ">"
+    if column not in nullable:
+        return f"({column}, id) {op} (?, ?)", [value, last_id]
+    # NULL-urile vin primele la ASC și ultimele la DESC
+    if value is None:
+        if descending:
+            return f"({column} IS NULL AND id < ?)", [last_id]
+        return f"(({column} IS NULL AND id > ?) OR {column} IS NOT NULL)", [last_id]
+    condition = f"(({column}, id) {op} (?, ?)"
+    return condition + (f" OR {column} IS NULL)" if descending else ")"), [value, last_id]
+
+
+def _page_rows(select, conditions, params, column, descending, after_key, limit, offset,
+               nullable=NULLABLE_ORDER_COLUMNS):
+    """Rows of one keyset page of select, ordered by (column, id); see get_invoices_page"""
+    conditions, params = list(conditions), list(params)
+    if after_key is not None:
+        condition, key_params = _keyset_condition(column, descending, after_key, nullable)
+        conditions.append(condition)
+        params.extend(key_params)
+    direction = "DESC" if descending else "ASC"
+    sql = select
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if column == "id":
+        sql += f" ORDER BY id {direction} LIMIT ?"
+    else:
+        sql += f" ORDER BY {column} {direction}, id {direction} LIMIT ?"
+    params.append(limit)
+    if offset:
+        sql += " OFFSET ?"
+        params.append(offset)
+    return get_connection().execute(sql, params).fetchall()
+
+
+def _row_key(row, column, columns):
+    # Cheia vine din rândul citit, nu din Invoice: clean_text face "" -> None și taie spațiile,
+    # iar o cheie diferită de valoarea salvată sare rânduri sau repetă pagini
+    return row[columns.index(column)], row[0]
+
+
+def _filter_conditions(filters):
+    conditions, params = [], []
+    for name, value in (filters or {}).items():
+        if name not in INVOICE_FILTERS:
+            raise ValueError(f"Unknown invoice filter {name!r}; use one of {', '.join(INVOICE_FILTERS)}")
+        if value is not None and value != "":
+            conditions.append(INVOICE_FILTERS[name])
+            params.append(value)
+    return conditions, params
+
+
+@_cached()
+def count_invoices(filters=None):
+    """Number of invoices matching filters (see get_invoices_page)"""
+    conditions, params = _filter_conditions(filters)
+    if not conditions:
+        # Fără filtre numărul vine din sumarul lunar, fără să parcurgem facturile
+        sql = "SELECT IFNULL(SUM(invoice_count), 0) FROM invoice_monthly_summary"
+    else:
+        sql = "SELECT COUNT(*) FROM invoices WHERE " + " AND ".join(conditions)
+    return get_connection().execute(sql, params).fetchone()[0]
+
+
+@_cached()
+def get_invoices_page(filters=None, order="-issue_date", after_key=None, limit=PAGE_SIZE, offset=0):
+    """One page of invoices as Invoice objects (with id), using keyset pagination.
+
+    filters: dict with any of date_from, date_to (ISO dates, inclusive), buyer,
+    currency, invoice_type. order: a column from ORDER_COLUMNS, prefixed with "-"
+    for descending; ties are broken by id. after_key: next_key of the previous
+    page, or None for the first page. Each page is one indexed range query, so
+    page 1000 costs the same as page 1. offset skips that many rows after
+    after_key, for jumping ahead; the skipped index entries are still stepped over.
+    """
+    column, descending = _parse_order(order)
+    conditions, params = _filter_conditions(filters)
+    rows = _page_rows(_SELECT_INVOICE, conditions, params, column, descending, after_key, limit, offset)
+    next_key = _row_key(rows[-1], column, _INVOICE_COLUMNS) if len(rows) == limit else None
+    return InvoicePage([_invoice_from_row(row) for row in rows], next_key)
+
+
+def iter_invoices(filters=None, order="-issue_date", page_size=PAGE_SIZE, with_lines=False):
+    """Yield every matching invoice, fetching page_size rows at a time.
+
+    with_lines=True also loads each page's products from invoice_line (one query per page).
+    """
+    after_key = None
+    while True:
+        # Fără cache: o listare completă ar umple cache-ul cu pagini citite o singură dată
+        page = get_invoices_page.__wrapped__(filters, order, after_key, page_size)
+        if with_lines:
+            attach_invoice_lines(page.rows)
+        yield from page.rows
+        if page.next_key is None:
+            return
+        after_key = page.next_key
+
+
+def _fts_query(text):
+    # Fiecare cuvânt devine un prefix între ghilimele, ca operatorii FTS5 (AND, NEAR, "-", ":")
+    # tastați de utilizator să fie tratați ca text obișnuit
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+
+@_cached()
+def search_invoices(query, limit=SEARCH_LIMIT):
+    """Invoices matching every word of query (as a prefix), best matches first.
+
+    Searches invoice number, buyer name and address, and the product lines;
+    case and diacritics are ignored. Relevance is computed over the newest
+    SEARCH_CANDIDATES matches. Returns Invoice objects with their id.
+    """
+    match = _fts_query(query or "")
+    if not match:
+        return []
+    params = (match, max(limit, SEARCH_CANDIDATES), limit)
+    return [_invoice_from_row(row) for row in get_connection().execute(_SEARCH_SQL, params)]
+
 
 def update_invoice(invoice_id: int, data: dict):
     """Update an existing invoice in the database"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         c = conn.cursor()
         
         # Map Romanian column names to database column names
@@ -178,75 +618,63 @@ def update_invoice(invoice_id: int, data: dict):
         mapped_data = {column_mapping.get(k, k): v for k, v in data.items()}
         set_clause = ', '.join(f"{col} = ?" for col in mapped_data.keys())
         sql = f"UPDATE invoices SET {set_clause} WHERE id = ?"
-        c.execute(sql, tuple(mapped_data.values()) + (invoice_id,))
-        conn.commit()
+        with conn:
+            c.execute(sql, tuple(mapped_data.values()) + (invoice_id,))
+            if "invoice_lines" in mapped_data:
+                _write_lines(conn, [(invoice_id, mapped_data["invoice_lines"])], replace=True)
+        _note_write()
     except Exception as e:
         print(f"Error updating invoice: {e}")
         raise
-    finally:
-        conn.close()
 
 def delete_invoice(invoice_id: int):
     """Delete an invoice from the database"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("DELETE FROM invoices WHERE id = ?", (invoice_id,))
-        conn.commit()
+        conn = get_connection()
+        with conn:
+            conn.execute("DELETE FROM invoices WHERE id = ?", (invoice_id,))
+        _note_write()
     except Exception as e:
         print(f"Error deleting invoice: {e}")
         raise
-    finally:
-        conn.close()
 
+# Un dict gol înseamnă eroare și nu se păstrează în cache
+@_cached(keep=bool)
 def get_invoice_stats():
     """Return detailed statistics for invoices with advanced analysis"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_connection()
         c = conn.cursor()
         
-        # Total facturi
-        c.execute("SELECT COUNT(*) FROM invoices")
-        total_count = c.fetchone()[0]
-
-        # Total fără TVA
-        c.execute("SELECT SUM(total_no_vat) FROM invoices WHERE total_no_vat IS NOT NULL")
-        total_without_vat = c.fetchone()[0] or 0
-
-        # Total TVA
-        c.execute("SELECT SUM(total_vat) FROM invoices WHERE total_vat IS NOT NULL")
-        total_vat = c.fetchone()[0] or 0
+        # Toate cifrele vin din tabelele de sumar întreținute de triggere (vezi core/migrations.py),
+        # care au câte un rând pe lună / pe cumpărător, indiferent de numărul de facturi
+        c.execute("""
+            SELECT SUM(invoice_count), SUM(no_vat_count), SUM(sum_no_vat), SUM(vat_count), SUM(sum_vat),
+                   SUM(payment_count), SUM(sum_payment), SUM(zero_vat_count),
+                   SUM(vat_percent_count), SUM(vat_percent_sum)
+            FROM invoice_monthly_summary
+        """)
+        (total_count, no_vat_count, total_without_vat, vat_count, total_vat,
+         payment_count, sum_payment, zero_vat_count, vat_percent_count, vat_percent_sum) = \
+            (value or 0 for value in c.fetchone())
 
         # Total cu TVA
         total_with_vat = total_without_vat + total_vat
 
         # Medii pe factură
-        c.execute("SELECT AVG(total_no_vat), AVG(total_vat), AVG(total_payment) FROM invoices")
-        avg_no_vat, avg_vat, avg_payment = c.fetchone()
-        avg_no_vat = avg_no_vat or 0
-        avg_vat = avg_vat or 0
-        avg_payment = avg_payment or 0
+        avg_no_vat = total_without_vat / no_vat_count if no_vat_count else 0
+        avg_vat = total_vat / vat_count if vat_count else 0
+        avg_payment = sum_payment / payment_count if payment_count else 0
 
         # Distribuția TVA
-        c.execute("""
-            SELECT AVG(CASE WHEN total_no_vat>0 THEN (total_vat/total_no_vat)*100 ELSE 0 END) FROM invoices
-        """)
-        avg_vat_percent = c.fetchone()[0] or 0
-
-        c.execute("SELECT COUNT(*) FROM invoices WHERE total_vat IS NULL OR total_vat=0")
-        pct_no_vat = (c.fetchone()[0] / total_count * 100) if total_count else 0
+        avg_vat_percent = vat_percent_sum / vat_percent_count if vat_percent_count else 0
+        pct_no_vat = (zero_vat_count / total_count * 100) if total_count else 0
 
         # Grafic lunar stacked Net + TVA și valoare medie pe lună
         c.execute("""
-            SELECT substr(issue_date,1,7) as month,
-                   SUM(total_no_vat) as sum_no_vat,
-                   SUM(total_vat) as sum_vat,
-                   SUM(total_payment) as sum_with_vat,
-                   COUNT(*) as count,
-                   AVG(total_payment) as avg_payment
-            FROM invoices
-            WHERE issue_date IS NOT NULL
-            GROUP BY substr(issue_date,1,7)
+            SELECT month, sum_no_vat, sum_vat, sum_payment, invoice_count,
+                   CASE WHEN payment_count > 0 THEN sum_payment / payment_count END as avg_payment
+            FROM invoice_monthly_summary
             ORDER BY month ASC
         """)
         monthly_rows = c.fetchall()
@@ -264,10 +692,9 @@ def get_invoice_stats():
 
         # Top 5 clienți după valoare totală
         c.execute("""
-            SELECT buyer_name, SUM(total_payment) as total 
-            FROM invoices
-            GROUP BY buyer_name
-            ORDER BY total DESC
+            SELECT NULLIF(buyer_name, ''), sum_payment as total
+            FROM invoice_buyer_summary
+            ORDER BY sum_payment DESC
             LIMIT 5
         """)
         top_clients = c.fetchall()
@@ -292,9 +719,118 @@ def get_invoice_stats():
     except Exception as e:
         print(f"Error getting stats: {e}")
         return {}
-    finally:
-        if 'conn' in locals():
-            conn.close()
+
+
+@_cached()
+def get_product_stats(limit=10):
+    """Best-selling products by net revenue, as ProductStats, from one aggregate over invoice_line.
+
+    The query reads only idx_invoice_line_product. Amounts of different currencies are added together.
+    """
+    rows = get_connection().execute("""
+        SELECT product_name, SUM(quantity), SUM(quantity * unit_price) AS net,
+               SUM(quantity * unit_price * vat_rate / 100), COUNT(DISTINCT invoice_id)
+        FROM invoice_line
+        GROUP BY product_name
+        ORDER BY net DESC
+        LIMIT ?
+    """, (limit,))
+    return [ProductStats(name, quantity, net, vat, net + vat, count) for name, quantity, net, vat, count in rows]
+
+
+def _pdf_text_conditions(text):
+    """PDFs whose invoice number or buyer starts with text, ignoring case; both columns are indexed"""
+    if not text:
+        return [], []
+    pattern = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return ["(invoice_number LIKE ? ESCAPE '\\' OR buyer_name LIKE ? ESCAPE '\\')"], [pattern, pattern]
+
+
+@_cached()
+def count_pdf_files(text=None):
+    """Number of indexed PDFs matching text (see get_pdf_files_page)"""
+    conditions, params = _pdf_text_conditions(text)
+    sql = "SELECT COUNT(*) FROM pdf_file"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    return get_connection().execute(sql, params).fetchone()[0]
+
+
+@_cached()
+def get_pdf_files_page(text=None, order="-mtime_ns", after_key=None, limit=PAGE_SIZE, offset=0):
+    """One page of the PDF index as PdfFile rows, with keyset pagination like get_invoices_page.
+
+    text keeps the PDFs whose invoice number or buyer name starts with it (any case).
+    order is a column from PDF_ORDER_COLUMNS, prefixed with "-" for descending.
+    """
+    column, descending = _parse_order(order, PDF_ORDER_COLUMNS)
+    conditions, params = _pdf_text_conditions(text)
+    rows = [PdfFile(*row) for row in _page_rows(_SELECT_PDF_FILE, conditions, params, column, descending,
+                                                after_key, limit, offset, PDF_NULLABLE_ORDER_COLUMNS)]
+    next_key = (getattr(rows[-1], column), rows[-1].id) if len(rows) == limit else None
+    return InvoicePage(rows, next_key)
+
+
+def get_unacknowledged_renames():
+    """NumberRename for each duplicate invoice number the upgrade changed that the user has not seen yet"""
+    rows = get_connection().execute("SELECT invoice_id, old_number, new_number FROM invoice_number_rename "
+                                    "WHERE acknowledged = 0 ORDER BY invoice_id")
+    return [NumberRename(*row) for row in rows]
+
+
+def acknowledge_renames(invoice_ids):
+    """Mark the renames of invoice_ids as shown, so get_unacknowledged_renames skips them"""
+    conn = get_connection()
+    with conn:
+        conn.executemany("UPDATE invoice_number_rename SET acknowledged = 1 WHERE invoice_id = ?",
+                         [(invoice_id,) for invoice_id in invoice_ids])
+
+
+def get_pdf_file_state():
+    """{file_name: (size, mtime_ns)} for every indexed PDF, to compare the index with the directory"""
+    rows = get_connection().execute("SELECT file_name, size, mtime_ns FROM pdf_file")
+    return {name: (size, mtime_ns) for name, size, mtime_ns in rows}
+
+
+def find_invoice_details(invoice_numbers):
+    """{invoice_number: (buyer_name, issue_date)} for the numbers that exist in the database"""
+    conn = get_connection()
+    details = {}
+    for chunk in _chunks(dict.fromkeys(invoice_numbers), LINE_QUERY_BATCH):
+        sql = (f"SELECT invoice_number, buyer_name, issue_date FROM invoices "
+               f"WHERE invoice_number IN ({', '.join('?' for _ in chunk)})")
+        details.update((number, (buyer, date)) for number, buyer, date in conn.execute(sql, chunk))
+    return details
+
+
+def record_pdf_files(entries, batch_size=INSERT_BATCH_SIZE):
+    """Add or update PDF index entries (file_name, invoice_number, buyer_name, issue_date, size, mtime_ns).
+
+    A None invoice_number, buyer_name or issue_date keeps the value already in the
+    index. One transaction per batch_size entries; returns how many were written.
+    """
+    conn = get_connection()
+    written = 0
+    for chunk in _chunks(entries, batch_size):
+        with conn:
+            conn.executemany(_RECORD_PDF_FILE_SQL, chunk)
+        written += len(chunk)
+    if written:
+        _note_write()
+    return written
+
+
+def remove_pdf_files(file_names, batch_size=INSERT_BATCH_SIZE):
+    """Drop these files from the PDF index; returns how many were removed"""
+    conn = get_connection()
+    removed = 0
+    for chunk in _chunks(file_names, batch_size):
+        with conn:
+            removed += conn.executemany("DELETE FROM pdf_file WHERE file_name = ?",
+                                        [(name,) for name in chunk]).rowcount
+    if removed:
+        _note_write()
+    return removed
 
 
 
@@ -0,0 +1,186 @@
+"""Lightweight invoice record shared by the database layer, the PDF renderer and the GUI"""
+import re
+
+# (atribut / coloană în baza de date, coloană în UI, tip)
+FIELDS = (
+    ("invoice_number", "Număr factură", str),
+    ("issue_date", "Data emiterii", str),
+    ("invoice_type", "Tip factură", str),
+    ("currency", "Monedă", str),
+    ("buyer_name", "Nume cumpărător", str),
+    ("buyer_legal_id", "ID legal cumpărător", str),
+    ("buyer_vat_id", "ID TVA cumpărător", str),
+    ("buyer_street", "Stradă cumpărător", str),
+    ("buyer_city", "Oraș cumpărător", str),
+    ("buyer_county", "Județ cumpărător", str),
+    ("buyer_postal_code", "Cod poștal cumpărător", str),
+    ("buyer_country", "Țară cumpărător", str),
+    ("payment_terms", "Termeni plată", str),
+    ("invoice_lines", "Linii factură (produse)", str),
+    ("total_no_vat", "Valoare totală fără TVA", float),
+    ("total_vat", "Total TVA", float),
+    ("total_payment", "Total plată", float),
+)
+
+UI_COLUMNS = [label for _, label, _ in FIELDS]
+COLUMN_MAPPING = {label: attr for attr, label, _ in FIELDS}
+REVERSE_MAPPING = {attr: label for attr, label, _ in FIELDS}
+
+# Cota TVA pentru liniile în formatul vechi "Produs x2 @ 100 RON", care nu o conțin
+DEFAULT_VAT_RATE = 19.0
+_LEGACY_LINE = re.compile(r"^(?P<name>.+?)\s+x\s*(?P<quantity>\d+(?:[.,]\d+)?)\s*@\s*"
+                          r"(?P<unit_price>\d+(?:[.,]\d+)?)(?:\s*[A-Za-z]{3})?$")
+
+
+def clean_text(value):
+    """None for missing values (None, NaN, blank), otherwise the stripped string"""
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def clean_number(value):
+    """float for numeric values, None for missing or unparsable ones"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return None if value != value else float(value)
+    value = clean_text(value)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def product_line(name, quantity, unit_price, vat_rate):
+    """One product as used by the PDF renderer, with its subtotal, VAT and total"""
+    subtotal = quantity * unit_price
+    vat_amount = subtotal * vat_rate / 100
+    return {"name": name, "quantity": quantity, "unit_price": unit_price, "vat_rate": vat_rate,
+            "subtotal": subtotal, "vat_amount": vat_amount, "total": subtotal + vat_amount}
+
+
+def _parse_line(line):
+    parts = [part.strip() for part in line.split("|")]
+    try:
+        if len(parts) >= 4:
+            return product_line(parts[0], float(parts[1]), float(parts[2]), float(parts[3]))
+        legacy = _LEGACY_LINE.match(line)
+        if legacy:
+            return product_line(legacy["name"], float(legacy["quantity"].replace(",", ".")),
+                                float(legacy["unit_price"].replace(",", ".")), DEFAULT_VAT_RATE)
+    except ValueError:
+        pass
+    return None
+
+
+def iter_product_lines(lines):
+    """Yield the products of an invoice one at a time.
+
+    lines is an Invoice (its loaded products, otherwise its invoice_lines text) or the
+    "name|qty|price|vat;..." text itself. The old "name xQTY @ PRICE CUR" format is
+    read with DEFAULT_VAT_RATE; malformed lines are skipped.
+    """
+    if isinstance(lines, Invoice):
+        if lines.products is not None:
+            yield from lines.products
+            return
+        lines = lines.invoice_lines
+    if not lines or not isinstance(lines, str):
+        return
+    start, length = 0, len(lines)
+    while start < length:
+        end = lines.find(";", start)
+        if end == -1:
+            end = length
+        line = lines[start:end].strip()
+        start = end + 1
+        if line:
+            product = _parse_line(line)
+            if product is not None:
+                yield product
+
+
+def _format_number(value):
+    # repr păstrează toate zecimalele (":g" ar rotunji la 6 cifre); 2.0 se scrie "2"
+    text = repr(float(value))
+    return text[:-2] if text.endswith(".0") else text
+
+
+def format_product_lines(products):
+    """The invoice_lines text for products given as dicts or (name, quantity, unit_price, vat_rate)"""
+    rows = (product if isinstance(product, (tuple, list)) else
+            (product["name"], product["quantity"], product["unit_price"], product["vat_rate"])
+            for product in products)
+    return ";".join(f"{name}|{_format_number(quantity)}|{_format_number(unit_price)}|{_format_number(vat_rate)}"
+                    for name, quantity, unit_price, vat_rate in rows)
+
+
+class Invoice:
+    """One invoice with typed fields; empty text is None, totals are float or None.
+
+    products holds the invoice's lines when they were loaded from the invoice_line
+    table (see db_handler.attach_invoice_lines); None means "parse invoice_lines".
+    """
+    __slots__ = ("id", "products") + tuple(attr for attr, _, _ in FIELDS)
+
+    def __init__(self, id=None, products=None, **fields):
+        self.id = int(id) if clean_number(id) is not None else None
+        self.products = products
+        for attr, _, kind in FIELDS:
+            value = fields.get(attr)
+            setattr(self, attr, clean_number(value) if kind is float else clean_text(value))
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build from a mapping keyed by UI (Romanian) or database column names, or a sqlite3.Row"""
+        if not isinstance(data, dict):
+            data = dict(data)
+        return cls(**{COLUMN_MAPPING.get(key, key): value for key, value in data.items()})
+
+    @classmethod
+    def coerce(cls, row):
+        """Accept an Invoice, a dict, a sqlite3.Row or a pandas Series"""
+        if isinstance(row, cls):
+            return row
+        if hasattr(row, "to_dict"):
+            row = row.to_dict()
+        return cls.from_dict(row)
+
+    def text(self, attr, default="N/A"):
+        value = getattr(self, attr)
+        return default if value is None else str(value)
+
+    def values(self):
+        return tuple(getattr(self, attr) for attr, _, _ in FIELDS)
+
+    def to_dict(self):
+        """Mapping keyed by the UI column names, as used by the table and insert_invoice"""
+        return {label: getattr(self, attr) for attr, label, _ in FIELDS}
+
+    def to_db_dict(self):
+        return {attr: getattr(self, attr) for attr, _, _ in FIELDS}
+
+    def __eq__(self, other):
+        if not isinstance(other, Invoice):
+            return NotImplemented
+        return self.id == other.id and self.values() == other.values()
+
+    def __repr__(self):
+        return f"Invoice(id={self.id!r}, invoice_number={self.invoice_number!r}, buyer_name={self.buyer_name!r})"
+
+
+def iter_invoices_from(data):
+    """Yield the Invoice objects of invoices_from(data) one at a time, reading data lazily"""
+    if data is None:
+        return
+    if hasattr(data, "columns") and hasattr(data, "to_dict"):
+        data = data.to_dict("records")
+    for row in data:
+        yield Invoice.coerce(row)
+
+
+def invoices_from(data):
+    """List of Invoice from a DataFrame, or any iterable of dicts / rows / Invoice objects"""
+    return list(iter_invoices_from(data))
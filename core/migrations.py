@@ -0,0 +1,293 @@
+"""Versioned schema migrations for data/invoices.db.
+
+The schema version is kept in PRAGMA user_version. MIGRATIONS[n] upgrades a
+database from version n to n + 1; a step is either an SQL statement or a
+callable taking the connection. Append new migrations at the end and never
+edit one that has already shipped.
+"""
+import sqlite3
+
+from core.invoice_record import iter_product_lines
+
+
+def _create_invoices(conn):
+    # Bazele de date existente au deja tabelul, dar user_version = 0
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS invoices (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        invoice_number TEXT NOT NULL,
+        issue_date TEXT NOT NULL,
+        invoice_type TEXT,
+        currency TEXT,
+        buyer_name TEXT,
+        buyer_legal_id TEXT,
+        buyer_vat_id TEXT,
+        buyer_street TEXT,
+        buyer_city TEXT,
+        buyer_county TEXT,
+        buyer_postal_code TEXT,
+        buyer_country TEXT,
+        payment_terms TEXT,
+        invoice_lines TEXT,
+        total_no_vat REAL,
+        total_vat REAL,
+        total_payment REAL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+_CREATE_NUMBER_RENAME = """
+    CREATE TABLE IF NOT EXISTS invoice_number_rename (
+        invoice_id INTEGER PRIMARY KEY,
+        old_number TEXT NOT NULL,
+        new_number TEXT NOT NULL,
+        acknowledged INTEGER NOT NULL DEFAULT 0
+    )
+    """
+
+
+def _deduplicate_invoice_numbers(conn):
+    # Indexul UNIQUE nu se poate crea peste duplicate: numerele repetate primesc sufixul " (id)"
+    # (un număr gol devine "(id)"). Redenumirile rămân în invoice_number_rename, iar fereastra
+    # principală i le arată utilizatorului la pornire (db_handler.get_unacknowledged_renames)
+    conn.execute(_CREATE_NUMBER_RENAME)
+    renamed = conn.execute("""
+    INSERT INTO invoice_number_rename (invoice_id, old_number, new_number)
+    SELECT id, invoice_number, ltrim(invoice_number || ' (' || id || ')') FROM invoices
+    WHERE EXISTS (SELECT 1 FROM invoices AS first
+                  WHERE first.invoice_number = invoices.invoice_number AND first.id < invoices.id)
+    """).rowcount
+    conn.execute("""
+    UPDATE invoices SET invoice_number = (SELECT new_number FROM invoice_number_rename
+                                          WHERE invoice_id = invoices.id)
+    WHERE id IN (SELECT invoice_id FROM invoice_number_rename)
+    """)
+    if renamed:
+        print(f"⚠️  {renamed} duplicate invoice number(s) renamed to '<number> (<id>)'; "
+              f"see the invoice_number_rename table")
+
+
+# Coloanele din invoices indexate pentru căutare full-text, în ordinea din invoices_fts
+FTS_COLUMNS = ("invoice_number", "buyer_name", "buyer_city", "buyer_street", "buyer_county",
+               "buyer_country", "invoice_lines")
+
+
+def _fts_values(prefix):
+    return ", ".join(f"{prefix}.{column}" for column in FTS_COLUMNS)
+
+
+# Coloanele tabelelor de sumar, cu contribuția unei facturi ({row} = new / old / invoices).
+# Numărătorile *_count permit medii identice cu AVG() din SQL, care ignoră NULL-urile.
+_VAT_PERCENT = "(CASE WHEN {row}.total_no_vat > 0 THEN ({row}.total_vat / {row}.total_no_vat) * 100 ELSE 0 END)"
+SUMMARY_COLUMNS = (
+    ("invoice_count", "1"),
+    ("no_vat_count", "({row}.total_no_vat IS NOT NULL)"),
+    ("sum_no_vat", "IFNULL({row}.total_no_vat, 0)"),
+    ("vat_count", "({row}.total_vat IS NOT NULL)"),
+    ("sum_vat", "IFNULL({row}.total_vat, 0)"),
+    ("payment_count", "({row}.total_payment IS NOT NULL)"),
+    ("sum_payment", "IFNULL({row}.total_payment, 0)"),
+    ("zero_vat_count", "({row}.total_vat IS NULL OR {row}.total_vat = 0)"),
+    ("vat_percent_count", f"({_VAT_PERCENT} IS NOT NULL)"),
+    ("vat_percent_sum", f"IFNULL({_VAT_PERCENT}, 0)"),
+)
+# tabel de sumar -> (cheie, expresia cheii pentru un rând din invoices)
+SUMMARY_TABLES = {
+    "invoice_monthly_summary": ("month", "substr({row}.issue_date, 1, 7)"),
+    "invoice_buyer_summary": ("buyer_name", "IFNULL({row}.buyer_name, '')"),
+}
+# Coloanele din invoices de care depind sumarele
+_SUMMARY_SOURCES = "issue_date, buyer_name, total_no_vat, total_vat, total_payment"
+
+
+def _summary_table(table, key):
+    columns = ", ".join(f"{column} {'INTEGER' if column.endswith('_count') else 'REAL'} NOT NULL DEFAULT 0"
+                        for column, _ in SUMMARY_COLUMNS)
+    return f"CREATE TABLE {table} ({key} TEXT PRIMARY KEY NOT NULL, {columns})"
+
+
+def _summary_change(table, row, sign):
+    """Statements adding (sign "+") or removing (sign "-") one invoice row from a summary table"""
+    key, key_expr = SUMMARY_TABLES[table]
+    key_expr = key_expr.format(row=row)
+    names = ", ".join(column for column, _ in SUMMARY_COLUMNS)
+    values = ", ".join(f"{sign}{expr.format(row=row)}" for _, expr in SUMMARY_COLUMNS)
+    updates = ", ".join(f"{column} = {column} + excluded.{column}" for column, _ in SUMMARY_COLUMNS)
+    statements = f"INSERT INTO {table} ({key}, {names}) VALUES ({key_expr}, {values}) " \
+                 f"ON CONFLICT ({key}) DO UPDATE SET {updates};"
+    if sign == "-":
+        statements += f" DELETE FROM {table} WHERE {key} = {key_expr} AND invoice_count = 0;"
+    return statements
+
+
+def _summary_triggers(table):
+    return [
+        f"CREATE TRIGGER {table}_insert AFTER INSERT ON invoices BEGIN {_summary_change(table, 'new', '+')} END",
+        f"CREATE TRIGGER {table}_delete AFTER DELETE ON invoices BEGIN {_summary_change(table, 'old', '-')} END",
+        f"CREATE TRIGGER {table}_update AFTER UPDATE OF {_SUMMARY_SOURCES} ON invoices BEGIN "
+        f"{_summary_change(table, 'old', '-')} {_summary_change(table, 'new', '+')} END",
+    ]
+
+
+def rebuild_summaries(conn):
+    """Recompute the summary tables from invoices (used by the migration; also repairs float drift)"""
+    for table, (key, key_expr) in SUMMARY_TABLES.items():
+        key_expr = key_expr.format(row="invoices")
+        names = ", ".join(column for column, _ in SUMMARY_COLUMNS)
+        sums = ", ".join(f"SUM({expr.format(row='invoices')})" for _, expr in SUMMARY_COLUMNS)
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"INSERT INTO {table} ({key}, {names}) SELECT {key_expr}, {sums} FROM invoices GROUP BY 1")
+
+
+# Câte linii de produs se scriu într-un executemany când se migrează coloana text
+LINE_MIGRATION_BATCH = 5000
+
+
+def _load_invoice_lines(conn):
+    # Liniile se citesc din coloana text (inclusiv formatul vechi "Produs x2 @ 100 RON");
+    # coloana rămâne ca text pentru afișare și pentru căutarea full-text
+    sql = ("INSERT INTO invoice_line (invoice_id, position, product_name, quantity, unit_price, vat_rate) "
+           "VALUES (?, ?, ?, ?, ?, ?)")
+    batch = []
+    for invoice_id, text in conn.execute("SELECT id, invoice_lines FROM invoices WHERE invoice_lines IS NOT NULL"):
+        for position, product in enumerate(iter_product_lines(text)):
+            batch.append((invoice_id, position, product["name"], product["quantity"],
+                          product["unit_price"], product["vat_rate"]))
+        if len(batch) >= LINE_MIGRATION_BATCH:
+            conn.executemany(sql, batch)
+            batch.clear()
+    if batch:
+        conn.executemany(sql, batch)
+
+
+# (descriere, pași)
+MIGRATIONS = [
+    ("create invoices table", [_create_invoices]),
+    ("indexes for lookups, sorting and the statistics queries", [
+        _deduplicate_invoice_numbers,
+        "CREATE UNIQUE INDEX idx_invoices_invoice_number ON invoices (invoice_number)",
+        "ALTER TABLE invoices ADD COLUMN issue_month TEXT GENERATED ALWAYS AS (substr(issue_date, 1, 7)) VIRTUAL",
+        "CREATE INDEX idx_invoices_issue_date ON invoices (issue_date)",
+        # Acoperă top clienți: GROUP BY buyer_name cu SUM(total_payment), fără acces la tabel
+        "CREATE INDEX idx_invoices_buyer_totals ON invoices (buyer_name, total_payment)",
+        # Acoperă totalurile lunare și agregatele generale din get_invoice_stats
+        "CREATE INDEX idx_invoices_month_totals ON invoices (issue_month, total_no_vat, total_vat, total_payment)",
+    ]),
+    ("buyer index in (buyer_name, id) order for keyset pagination", [
+        "CREATE INDEX idx_invoices_buyer_name ON invoices (buyer_name)",
+    ]),
+    ("full-text search index over buyers, addresses and invoice lines", [
+        # External content: textul rămâne doar în invoices, FTS ține numai indexul.
+        # remove_diacritics face ca "Timisoara" să găsească "Timișoara".
+        f"""CREATE VIRTUAL TABLE invoices_fts USING fts5(
+            {", ".join(FTS_COLUMNS)},
+            content='invoices', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        f"""CREATE TRIGGER invoices_fts_insert AFTER INSERT ON invoices BEGIN
+            INSERT INTO invoices_fts (rowid, {", ".join(FTS_COLUMNS)}) VALUES (new.id, {_fts_values("new")});
+        END""",
+        f"""CREATE TRIGGER invoices_fts_delete AFTER DELETE ON invoices BEGIN
+            INSERT INTO invoices_fts (invoices_fts, rowid, {", ".join(FTS_COLUMNS)})
+            VALUES ('delete', old.id, {_fts_values("old")});
+        END""",
+        f"""CREATE TRIGGER invoices_fts_update AFTER UPDATE OF {", ".join(FTS_COLUMNS)} ON invoices BEGIN
+            INSERT INTO invoices_fts (invoices_fts, rowid, {", ".join(FTS_COLUMNS)})
+            VALUES ('delete', old.id, {_fts_values("old")});
+            INSERT INTO invoices_fts (rowid, {", ".join(FTS_COLUMNS)}) VALUES (new.id, {_fts_values("new")});
+        END""",
+        "INSERT INTO invoices_fts (invoices_fts) VALUES ('rebuild')",
+    ]),
+    ("monthly and per-buyer summary tables kept up to date by triggers", [
+        *[_summary_table(table, key) for table, (key, _) in SUMMARY_TABLES.items()],
+        "CREATE INDEX idx_invoice_buyer_summary_payment ON invoice_buyer_summary (sum_payment)",
+        *[trigger for table in SUMMARY_TABLES for trigger in _summary_triggers(table)],
+        rebuild_summaries,
+    ]),
+    ("invoice_line table with one typed row per product line", [
+        """CREATE TABLE invoice_line (
+            id INTEGER PRIMARY KEY,
+            invoice_id INTEGER NOT NULL REFERENCES invoices (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            product_name TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            unit_price REAL NOT NULL,
+            vat_rate REAL NOT NULL
+        )""",
+        # Liniile unui lot de facturi, în ordine, cu o singură căutare în index
+        "CREATE UNIQUE INDEX idx_invoice_line_invoice ON invoice_line (invoice_id, position)",
+        # Acoperă agregatele pe produs din get_product_stats, fără acces la tabel
+        "CREATE INDEX idx_invoice_line_product ON invoice_line "
+        "(product_name, quantity, unit_price, vat_rate, invoice_id)",
+        _load_invoice_lines,
+    ]),
+    ("pdf_file index of the PDFs in data/output_pdfs for the Invoices tab", [
+        # Se populează la prima sincronizare cu directorul (core/pdf_index.py).
+        # NOCASE: sortarea ignoră majusculele și filtrul LIKE 'text%' poate folosi indexul
+        """CREATE TABLE pdf_file (
+            id INTEGER PRIMARY KEY,
+            file_name TEXT NOT NULL UNIQUE,
+            invoice_number TEXT COLLATE NOCASE,
+            buyer_name TEXT COLLATE NOCASE,
+            issue_date TEXT,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL
+        )""",
+        "CREATE INDEX idx_pdf_file_invoice_number ON pdf_file (invoice_number)",
+        "CREATE INDEX idx_pdf_file_buyer_name ON pdf_file (buyer_name)",
+        "CREATE INDEX idx_pdf_file_issue_date ON pdf_file (issue_date)",
+        "CREATE INDEX idx_pdf_file_size ON pdf_file (size)",
+        "CREATE INDEX idx_pdf_file_mtime ON pdf_file (mtime_ns)",
+    ]),
+    ("drop the statistics indexes replaced by the summary tables", [
+        # get_invoice_stats citește invoice_monthly_summary / invoice_buyer_summary; cele două
+        # indexuri doar încetineau fiecare insert și update. Filtrul și ordonarea după
+        # cumpărător folosesc idx_invoices_buyer_name
+        "DROP INDEX IF EXISTS idx_invoices_month_totals",
+        "DROP INDEX IF EXISTS idx_invoices_buyer_totals",
+    ]),
+    ("invoice_number_rename table for databases upgraded before it existed", [
+        # Migrarea 2 o creează acum; bazele trecute deja prin ea o primesc goală
+        _CREATE_NUMBER_RENAME,
+    ]),
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply the pending migrations, each in its own transaction; returns the new version.
+
+    The version is re-read after taking the write lock, so two processes starting
+    at the same time don't apply the same migration twice.
+    """
+    version = schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than this application "
+                           f"({SCHEMA_VERSION}); please update the application")
+    while version < SCHEMA_VERSION:
+        conn.execute("BEGIN IMMEDIATE")
+        version = schema_version(conn)
+        if version >= SCHEMA_VERSION:
+            conn.rollback()
+            break
+        description, steps = MIGRATIONS[version]
+        try:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"Error applying migration {version + 1} ({description}): {e}")
+            raise
+        version += 1
+    return version
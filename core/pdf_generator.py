@@ -1,15 +1,57 @@
 from fpdf import FPDF
 from fpdf.enums import XPos, YPos
+import fontTools
+from fontTools import subset, ttLib
+from collections import namedtuple
+import hashlib
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import os
-import pandas as pd
+import threading
+import time
+import zipfile
+import sqlite3
+from datetime import datetime
 import json
 
+from core import pdf_index
+from core.invoice_record import Invoice, invoices_from, iter_invoices_from, iter_product_lines
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-FONT_PATH = os.path.join(BASE_DIR, "..", "fonts", "DejaVuSans.ttf")
-OUTPUT_DIR = os.path.join(BASE_DIR, "..", "data", "output_pdfs")
+FONTS_DIR = os.path.join(BASE_DIR, "..", "fonts")
+FONT_PATH = os.path.join(FONTS_DIR, "DejaVuSans.ttf")
+FONT_FILES = {
+    "": FONT_PATH,
+    "B": os.path.join(FONTS_DIR, "DejaVuSans-Bold.ttf"),
+    "I": os.path.join(FONTS_DIR, "DejaVuSans-Oblique.ttf"),
+}
+OUTPUT_DIR = pdf_index.OUTPUT_DIR
+FONT_CACHE_DIR = os.path.join(BASE_DIR, "..", "data", "font_cache")
+# Caracterele păstrate în fontul redus: latină (inclusiv ș, ț), greacă, chirilică, punctuație,
+# simboluri monetare și literale. O factură cu alte caractere e refăcută cu fontul complet
+FONT_UNICODE_RANGES = ((0x20, 0x7E), (0xA0, 0x24F), (0x370, 0x4FF), (0x2000, 0x206F), (0x20A0, 0x20CF),
+                       (0x2100, 0x214F))
 USER_SETTINGS_PATH = os.path.join(BASE_DIR, "..", "data", "user_settings.json")
+MANIFEST_NAME = ".manifest.json"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Rezultatul generării unei singure facturi, în ordinea din DataFrame
+InvoiceResult = namedtuple("InvoiceResult", ["index", "invoice_number", "file_path", "error", "elapsed"])
+
+# Ce trebuie regenerat: pending = (poziție în listă, Invoice) pentru facturi noi sau modificate
+RegenerationPlan = namedtuple("RegenerationPlan", ["pending", "unchanged", "stale", "orphaned", "fingerprints"])
+
+# Procesele din pool pornesc prin spawn, nu fork: generarea rulează și dintr-un fir al interfeței Qt,
+# iar un fork dintr-un proces cu mai multe fire poate moșteni lock-uri ținute de alte fire
+POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+# Setările încărcate o singură dată în fiecare proces din pool
+_worker_settings = None
+
+# Fontul redus al fiecărui stil, construit o singură dată per proces: stil -> cale
+_reduced_fonts = {}
+
 
 def load_user_settings():
     if not os.path.exists(USER_SETTINGS_PATH):
@@ -25,6 +67,47 @@ def load_user_settings():
         return {}
 
 
+def _reduced_font(style):
+    """Path of the DejaVu face for style cut down to FONT_UNICODE_RANGES.
+
+    fpdf2 loads and subsets every registered font again for each document; starting
+    from ~1200 glyphs instead of ~6000 makes that about twice as fast. The file is
+    built once and kept in FONT_CACHE_DIR under a name that changes with the source
+    font, the ranges and the fontTools version.
+    """
+    if style not in _reduced_fonts:
+        source = FONT_FILES[style]
+        stat = os.stat(source)
+        key = repr((stat.st_size, stat.st_mtime_ns, FONT_UNICODE_RANGES, fontTools.version))
+        name = os.path.splitext(os.path.basename(source))[0]
+        path = os.path.join(FONT_CACHE_DIR, f"{name}-{hashlib.sha256(key.encode()).hexdigest()[:16]}.ttf")
+        if not os.path.exists(path):
+            font = ttLib.TTFont(source, recalcTimestamp=False)
+            options = subset.Options(notdef_outline=True, recommended_glyphs=True, name_IDs=["*"])
+            # Tabelele pe care fpdf2 le elimină oricum la încorporare (fără text shaping)
+            options.drop_tables += ["FFTM", "GDEF", "GPOS", "GSUB"]
+            subsetter = subset.Subsetter(options)
+            subsetter.populate(unicodes=[code for first, last in FONT_UNICODE_RANGES
+                                         for code in range(first, last + 1)])
+            subsetter.subset(font)
+            os.makedirs(FONT_CACHE_DIR, exist_ok=True)
+            # Procesele din pool pot construi același fișier în paralel: fiecare scrie separat și îl înlocuiește atomic
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            font.save(tmp_path)
+            os.replace(tmp_path, path)
+        _reduced_fonts[style] = path
+    return _reduced_fonts[style]
+
+
+def preload_fonts():
+    """Build the reduced DejaVu faces up front (used by pool workers)"""
+    try:
+        for style in FONT_FILES:
+            _reduced_font(style)
+    except Exception as e:
+        print(f"Warning: Could not load custom font: {e}")
+
+
 class ModernPDFInvoice(FPDF):
     BRAND_BLUE = (41, 128, 185)
     DARK_GRAY = (52, 73, 94)
@@ -32,82 +115,245 @@ class ModernPDFInvoice(FPDF):
     WHITE = (255, 255, 255)
     SUCCESS_GREEN = (39, 174, 96)
     TEXT_GRAY = (127, 140, 141)
+    ROW_GRAY = (248, 249, 250)
 
-    def __init__(self, company_name="YOUR COMPANY"):
+    def __init__(self, company_name="YOUR COMPANY", template=None, full_fonts=False):
+        """full_fonts=True embeds from the complete DejaVu faces instead of the reduced ones"""
         super().__init__()
-        self.company_name = company_name
+        self.full_fonts = full_fonts
+        self.template = template or InvoiceTemplate.for_settings({'company': {'name': company_name}})
+        self.company_name = self.template.company_name
+        self.invoice_start_page = 1
         self.set_auto_page_break(auto=True, margin=15)
+        self._register_fonts()
 
-    def header(self):
-        if not hasattr(self, '_fonts_added'):
-            try:
-                self.add_font("DejaVu", "", FONT_PATH)
-                self.add_font("DejaVu", "B", FONT_PATH)
-                self.add_font("DejaVu", "I", FONT_PATH)
-                self._fonts_added = True
-            except Exception as e:
-                print(f"Warning: Could not load custom font: {e}")
-        self.set_fill_color(*self.BRAND_BLUE)
-        self.rect(0, 0, 210, 25, 'F')
-        self.set_xy(15, 8)
-        self.set_text_color(*self.WHITE)
+    def _register_fonts(self):
         try:
-            self.set_font("DejaVu", "B", 18)
-        except:
-            self.set_font("Arial", "B", 18)
-        self.cell(0, 10, self.company_name, align="L")
-        self.set_xy(140, 8)
+            for style, path in FONT_FILES.items():
+                self.add_font("DejaVu", style, path if self.full_fonts else _reduced_font(style))
+        except Exception as e:
+            print(f"Warning: Could not load custom font: {e}")
+
+    def has_missing_glyphs(self):
+        """True if some text used a character the registered fonts do not have"""
+        return any(getattr(font, "missing_glyphs", None) for font in self.fonts.values())
+
+    def set_invoice_font(self, style, size):
         try:
-            self.set_font("DejaVu", "B", 16)
+            self.set_font("DejaVu", style, size)
         except:
-            self.set_font("Arial", "B", 16)
-        self.cell(0, 10, "FACTURĂ", align="R")
-        self.set_text_color(*self.DARK_GRAY)
-        self.ln(35)
+            self.set_font("Arial", style, size)
+
+    def start_invoice(self, invoice_number=None):
+        """Open the first page of a new invoice; page numbers restart from 1 for it.
+
+        With invoice_number the invoice also gets an outline entry and a page label
+        prefix, which is how invoices are told apart in a combined PDF.
+        """
+        if invoice_number is None:
+            self.add_page()
+        else:
+            self.add_page(label_style="D", label_prefix=f"{invoice_number} - ", label_start=1)
+            self.start_section(f"Factura {invoice_number}")
+        self.invoice_start_page = self.page
+
+    def header(self):
+        self.template.draw_header(self)
 
     def footer(self):
         self.set_y(-20)
-        self.set_draw_color(*self.LIGHT_GRAY)
-        self.line(15, self.get_y()-5, 195, self.get_y()-5)
-        try:
-            self.set_font("DejaVu", "I", 9)
-        except:
-            self.set_font("Arial", "I", 9)
-        self.set_text_color(*self.TEXT_GRAY)
-        self.cell(0, 10, f"Pagina {self.page_no()}", align="C")
-        self.ln(5)
-        try:
-            self.set_font("DejaVu", "", 8)
-        except:
-            self.set_font("Arial", "", 8)
-        self.cell(0, 5, "Mulțumim pentru încrederea acordată!", align="C")
+        self.template.draw_footer(self, self.get_y())
+        self.cell(0, 10, f"Pagina {self.page_no() - self.invoice_start_page + 1}", align="C")
+        self.template.draw_footer_tail(self)
+
+
+class InvoiceTemplate:
+    """Invoice layout for one settings profile, built once and shared by every invoice.
+
+    It holds what depends only on the user settings (company name, seller card
+    text) and the positions of the fields; the draw methods render the static parts
+    (header band, cards, table header, totals frame, footer) straight into the
+    document, and render_invoice adds the per-invoice fields on top.
+    """
+    # Se incrementează la orice schimbare vizuală, ca PDF-urile existente să fie regenerate
+    VERSION = 2
+
+    # Coloanele tabelului de produse: (titlu, lățime, aliniere rânduri)
+    COLUMNS = [
+        ("Produs", 65, "L"),
+        ("Cant.", 18, "R"),
+        ("Preț unitar", 25, "R"),
+        ("Subtotal", 22, "R"),
+        ("TVA%", 15, "C"),
+        ("TVA", 20, "R"),
+        ("Total", 25, "R"),
+    ]
+    TITLE_XY = (20, 45)
+    BUYER_CARD_XY = (110, 75)
+    SELLER_CARD_XY = (15, 75)
+    CARD_SIZE = (85, 50)
+    PAYMENT_TERMS_XY = (15, 145)
+    TABLE_XY = (15, 160)
+    TABLE_HEADER_HEIGHT = 10
+    ROW_HEIGHT = 8
+    PRODUCT_NAME_MAX = 28
+    # Pe paginile de continuare tabelul începe imediat sub banda de antet
+    CONTINUATION_TABLE_Y = 35
+    # Spațiu rezervat jos pentru subsol; rândurile nu coboară sub pdf.h - PAGE_BOTTOM
+    PAGE_BOTTOM = 30
+    # Cadrul totalurilor (35) + mesajul de încheiere (la +50, înalt 5)
+    TOTALS_HEIGHT = 55
+
+    _cache = {}
+
+    def __init__(self, user_settings=None):
+        user_settings = user_settings or {}
+        company = user_settings.get('company') or {}
+        seller = user_settings.get('seller') or {}
+        self.company_name = company.get('name') or "YOUR COMPANY"
+        self.seller_content = [
+            f"Nume: {seller.get('name', 'Nu este setat')}",
+            f"ID legal: {seller.get('legal_id', 'Nu este setat')}",
+            f"ID TVA: {seller.get('vat', 'Nu este setat')}",
+            f"Stradă: {seller.get('street', 'Nu este setat')}",
+            f"{seller.get('city', 'Nu este setat')}, {seller.get('county', 'Nu este setat')}",
+            f"{seller.get('country', 'Nu este setat')}"
+        ]
+
+    @classmethod
+    def for_settings(cls, user_settings=None):
+        key = json.dumps(user_settings or {}, sort_keys=True, default=str)
+        template = cls._cache.get(key)
+        if template is None:
+            template = cls._cache[key] = cls(user_settings)
+        return template
+
+    def draw_header(self, pdf):
+        pdf.set_fill_color(*pdf.BRAND_BLUE)
+        pdf.rect(0, 0, 210, 25, 'F')
+        pdf.set_xy(15, 8)
+        pdf.set_text_color(*pdf.WHITE)
+        pdf.set_invoice_font("B", 18)
+        pdf.cell(0, 10, self.company_name, align="L")
+        pdf.set_xy(140, 8)
+        pdf.set_invoice_font("B", 16)
+        pdf.cell(0, 10, "FACTURĂ", align="R")
+        pdf.set_text_color(*pdf.DARK_GRAY)
+        pdf.ln(35)
+
+    def render_static(self, pdf):
+        pdf.set_fill_color(*pdf.LIGHT_GRAY)
+        pdf.rect(15, 40, 180, 25, 'F')
+        create_info_card(pdf, *self.SELLER_CARD_XY, *self.CARD_SIZE, "VÂNZĂTOR", self.seller_content, pdf.WHITE)
+        create_info_card(pdf, *self.BUYER_CARD_XY, *self.CARD_SIZE, "CUMPĂRĂTOR", [], pdf.WHITE)
+        self.draw_table_header(pdf, *self.TABLE_XY)
+
+    def draw_table_header(self, pdf, x, y):
+        pdf.set_fill_color(*pdf.DARK_GRAY)
+        pdf.set_text_color(*pdf.WHITE)
+        pdf.set_invoice_font("B", 9)
+        pdf.set_xy(x, y)
+        for title, width, _ in self.COLUMNS:
+            pdf.cell(width, self.TABLE_HEADER_HEIGHT, title, 1, align="C", fill=True)
+        pdf.ln()
+
+    def _draw_totals_frame(self, pdf, top):
+        pdf.set_fill_color(*pdf.LIGHT_GRAY)
+        pdf.rect(120, top, 75, 35, 'F')
+        pdf.line(125, top + 22, 190, top + 22)
+
+    def _draw_closing(self, pdf, top):
+        pdf.set_xy(15, top + 50)
+        pdf.set_text_color(*pdf.TEXT_GRAY)
+        pdf.set_invoice_font("I", 9)
+        pdf.cell(0, 5, "Vă mulțumim pentru colaborare și vă așteptăm din nou!", align="C")
+
+    def draw_footer(self, pdf, top):
+        pdf.set_draw_color(*pdf.LIGHT_GRAY)
+        pdf.line(15, top - 5, 195, top - 5)
+        pdf.set_invoice_font("I", 9)
+        pdf.set_text_color(*pdf.TEXT_GRAY)
+
+    def draw_footer_tail(self, pdf):
+        pdf.ln(5)
+        pdf.set_invoice_font("", 8)
+        pdf.cell(0, 5, "Mulțumim pentru încrederea acordată!", align="C")
+
+    def render_totals(self, pdf, top, subtotal, vat_total, total_payment, currency):
+        self._draw_totals_frame(pdf, top)
+        pdf.set_xy(125, top + 5)
+        pdf.set_text_color(*pdf.DARK_GRAY)
+        pdf.set_invoice_font("", 10)
+        pdf.cell(65, 7, f"Subtotal: {subtotal:.2f} {currency}", align="R")
+        pdf.set_xy(125, top + 13)
+        pdf.cell(65, 7, f"TVA: {vat_total:.2f} {currency}", align="R")
+        pdf.set_xy(120, top + 25)
+        pdf.set_fill_color(*pdf.SUCCESS_GREEN)
+        pdf.set_text_color(*pdf.WHITE)
+        pdf.set_invoice_font("B", 12)
+        pdf.cell(75, 10, f"TOTAL: {total_payment:.2f} {currency}", 1, align="C", fill=True)
+        self._draw_closing(pdf, top)
+
+    def continue_on_new_page(self, pdf, height, table_header=False):
+        """Start a continuation page if a block of the given height no longer fits; returns the new y"""
+        if pdf.get_y() + height <= pdf.h - self.PAGE_BOTTOM:
+            return None
+        pdf.add_page()
+        y = self.CONTINUATION_TABLE_Y
+        if table_header:
+            self.draw_table_header(pdf, self.TABLE_XY[0], y)
+            pdf.set_text_color(*pdf.DARK_GRAY)
+            pdf.set_invoice_font("", 8)
+            y += self.TABLE_HEADER_HEIGHT
+        pdf.set_xy(self.TABLE_XY[0], y)
+        return y
+
+    def render_product_table(self, pdf, products):
+        """Draw the product rows one by one, repeating the column header on every new page.
+
+        products may be any iterable (typically iter_product_lines), so memory does not
+        grow with the number of lines. Returns the (subtotal, vat, total) sums of the rows.
+        """
+        subtotal = vat_total = total = 0.0
+        count = 0
+        for count, product in enumerate(products, 1):
+            self.continue_on_new_page(pdf, self.ROW_HEIGHT, table_header=True)
+            self.render_product_row(pdf, count - 1, product)
+            subtotal += product["subtotal"]
+            vat_total += product["vat_amount"]
+            total += product["total"]
+        if not count:
+            pdf.set_fill_color(*pdf.ROW_GRAY)
+            pdf.set_x(self.TABLE_XY[0])
+            pdf.cell(190, 8, "Nu sunt produse definite", 1, align="C", fill=True)
+            pdf.ln()
+        return subtotal, vat_total, total
+
+    def render_product_row(self, pdf, index, product):
+        if index % 2 == 0:
+            pdf.set_fill_color(*pdf.ROW_GRAY)
+        else:
+            pdf.set_fill_color(*pdf.WHITE)
+        name = product["name"]
+        if len(name) > self.PRODUCT_NAME_MAX:
+            name = name[:self.PRODUCT_NAME_MAX] + "..."
+        values = (
+            name,
+            f'{product["quantity"]:.0f}',
+            f'{product["unit_price"]:.2f}',
+            f'{product["subtotal"]:.2f}',
+            f'{product["vat_rate"]:.0f}%',
+            f'{product["vat_amount"]:.2f}',
+            f'{product["total"]:.2f}',
+        )
+        pdf.set_x(self.TABLE_XY[0])
+        for (_, width, align), value in zip(self.COLUMNS, values):
+            pdf.cell(width, self.ROW_HEIGHT, value, 1, align=align, fill=True)
+        pdf.ln()
 
 
 def parse_product_lines(lines_str):
-    if pd.isna(lines_str) or not lines_str:
-        return []
-    products = []
-    lines = lines_str.split(";")
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        parts = [part.strip() for part in line.split("|")]
-        if len(parts) >= 4:
-            try:
-                product = {
-                    "name": parts[0],
-                    "quantity": float(parts[1]),
-                    "unit_price": float(parts[2]),
-                    "vat_rate": float(parts[3])
-                }
-                product["subtotal"] = product["quantity"] * product["unit_price"]
-                product["vat_amount"] = product["subtotal"] * product["vat_rate"] / 100
-                product["total"] = product["subtotal"] + product["vat_amount"]
-                products.append(product)
-            except (ValueError, IndexError):
-                continue
-    return products
+    return list(iter_product_lines(lines_str))
 
 
 def create_info_card(pdf, x, y, width, height, title, content, color):
@@ -117,17 +363,15 @@ def create_info_card(pdf, x, y, width, height, title, content, color):
     pdf.rect(x, y, width, 12, 'F')
     pdf.set_xy(x + 5, y + 3)
     pdf.set_text_color(*pdf.WHITE)
-    try:
-        pdf.set_font("DejaVu", "B", 10)
-    except:
-        pdf.set_font("Arial", "B", 10)
+    pdf.set_invoice_font("B", 10)
     pdf.cell(0, 6, title)
+    write_card_lines(pdf, x, y, content)
+
+
+def write_card_lines(pdf, x, y, content):
     pdf.set_xy(x + 5, y + 15)
     pdf.set_text_color(*pdf.DARK_GRAY)
-    try:
-        pdf.set_font("DejaVu", "", 9)
-    except:
-        pdf.set_font("Arial", "", 9)
+    pdf.set_invoice_font("", 9)
     line_height = 5
     for line in content:
         pdf.cell(0, line_height, line)
@@ -135,188 +379,428 @@ def create_info_card(pdf, x, y, width, height, title, content, color):
         pdf.set_x(x + 5)
 
 
-def safe_get(row, column_name, default="N/A"):
-    try:
-        value = row.get(column_name, default)
-        if pd.isna(value) or str(value).strip() == "":
-            return default
-        return str(value)
-    except:
-        return default
-
-
-def generate_invoice_pdf(row, user_settings=None):
-    user_settings = user_settings or {}
-    company = user_settings.get('company', {})
-    seller = user_settings.get('seller', {})
-    company_name = company.get('name', "YOUR COMPANY")
-    pdf = ModernPDFInvoice(company_name=company_name)
-    pdf.add_page()
-    pdf.set_xy(15, 40)
-    pdf.set_fill_color(*pdf.LIGHT_GRAY)
-    pdf.rect(15, 40, 180, 25, 'F')
-    pdf.set_xy(20, 45)
+def render_invoice(pdf, invoice, bookmark=False):
+    """Draw one invoice (Invoice, dict or pandas Series) on new page(s) of pdf"""
+    invoice = Invoice.coerce(invoice)
+    template = pdf.template
+    pdf.start_invoice(invoice.text('invoice_number') if bookmark else None)
+    template.render_static(pdf)
+    pdf.set_xy(*template.TITLE_XY)
     pdf.set_text_color(*pdf.DARK_GRAY)
-    try:
-        pdf.set_font("DejaVu", "B", 14)
-    except:
-        pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 8, f"FACTURĂ #{safe_get(row, 'Număr factură')}")
-    try:
-        pdf.set_font("DejaVu", "", 9)
-    except:
-        pdf.set_font("Arial", "", 9)
-    seller_content = [
-        f"Nume: {seller.get('name', 'Nu este setat')}",
-        f"ID legal: {seller.get('legal_id', 'Nu este setat')}",
-        f"ID TVA: {seller.get('vat', 'Nu este setat')}",
-        f"Stradă: {seller.get('street', 'Nu este setat')}",
-        f"{seller.get('city', 'Nu este setat')}, {seller.get('county', 'Nu este setat')}",
-        f"{seller.get('country', 'Nu este setat')}"
-    ]
-    create_info_card(pdf, 15, 75, 85, 50, "VÂNZĂTOR", seller_content, pdf.WHITE)
+    pdf.set_invoice_font("B", 14)
+    pdf.cell(0, 8, f"FACTURĂ #{invoice.text('invoice_number')}")
     buyer_content = [
-        f"Nume: {safe_get(row, 'Nume cumpărător')}",
-        f"ID legal: {safe_get(row, 'ID legal cumpărător')}",
-        f"ID TVA: {safe_get(row, 'ID TVA cumpărător')}",
-        f"Stradă: {safe_get(row, 'Stradă cumpărător')}",
-        f"{safe_get(row, 'Oraș cumpărător')}, {safe_get(row, 'Județ cumpărător')}",
-        f"{safe_get(row, 'Cod poștal cumpărător')}, {safe_get(row, 'Țară cumpărător')}"
+        f"Nume: {invoice.text('buyer_name')}",
+        f"ID legal: {invoice.text('buyer_legal_id')}",
+        f"ID TVA: {invoice.text('buyer_vat_id')}",
+        f"Stradă: {invoice.text('buyer_street')}",
+        f"{invoice.text('buyer_city')}, {invoice.text('buyer_county')}",
+        f"{invoice.text('buyer_postal_code')}, {invoice.text('buyer_country')}"
     ]
-    create_info_card(pdf, 110, 75, 85, 50, "CUMPĂRĂTOR", buyer_content, pdf.WHITE)
-    pdf.set_xy(15, 145)
+    write_card_lines(pdf, *template.BUYER_CARD_XY, buyer_content)
+    pdf.set_xy(*template.PAYMENT_TERMS_XY)
     pdf.set_fill_color(*pdf.BRAND_BLUE)
     pdf.set_text_color(*pdf.WHITE)
-    try:
-        pdf.set_font("DejaVu", "B", 9)
-    except:
-        pdf.set_font("Arial", "B", 9)
-    pdf.cell(180, 8, f"   Termeni de plată: {safe_get(row, 'Termeni plată')}", 'F')
-    pdf.ln(15)
-    pdf.set_fill_color(*pdf.DARK_GRAY)
-    pdf.set_text_color(*pdf.WHITE)
-    try:
-        pdf.set_font("DejaVu", "B", 9)
-    except:
-        pdf.set_font("Arial", "B", 9)
-    pdf.set_x(15)
-    pdf.cell(65, 10, "Produs", 1, align="C", fill=True)
-    pdf.cell(18, 10, "Cant.", 1, align="C", fill=True)
-    pdf.cell(25, 10, "Preț unitar", 1, align="C", fill=True)
-    pdf.cell(22, 10, "Subtotal", 1, align="C", fill=True)
-    pdf.cell(15, 10, "TVA%", 1, align="C", fill=True)
-    pdf.cell(20, 10, "TVA", 1, align="C", fill=True)
-    pdf.cell(25, 10, "Total", 1, align="C", fill=True)
-    pdf.ln()
-    products = parse_product_lines(safe_get(row, 'Linii factură (produse)', ""))
+    pdf.set_invoice_font("B", 9)
+    pdf.cell(180, 8, f"   Termeni de plată: {invoice.text('payment_terms')}", 'F')
+    table_x, table_y = template.TABLE_XY
+    pdf.set_xy(table_x, table_y + template.TABLE_HEADER_HEIGHT)
     pdf.set_text_color(*pdf.DARK_GRAY)
-    try:
-        pdf.set_font("DejaVu", "", 8)
-    except:
-        pdf.set_font("Arial", "", 8)
-    if not products:
-        pdf.set_fill_color(248, 249, 250)
-        pdf.set_x(15)
-        pdf.cell(190, 8, "Nu sunt produse definite", 1, align="C", fill=True)
-        pdf.ln()
-    else:
-        for i, product in enumerate(products):
-            if i % 2 == 0:
-                pdf.set_fill_color(248, 249, 250)
-            else:
-                pdf.set_fill_color(*pdf.WHITE)
-            product_name = product["name"][:28] + "..." if len(product["name"]) > 28 else product["name"]
-            pdf.set_x(15)
-            pdf.cell(65, 8, product_name, 1, fill=True)
-            pdf.cell(18, 8, f'{product["quantity"]:.0f}', 1, align="R", fill=True)
-            pdf.cell(25, 8, f'{product["unit_price"]:.2f}', 1, align="R", fill=True)
-            pdf.cell(22, 8, f'{product["subtotal"]:.2f}', 1, align="R", fill=True)
-            pdf.cell(15, 8, f'{product["vat_rate"]:.0f}%', 1, align="C", fill=True)
-            pdf.cell(20, 8, f'{product["vat_amount"]:.2f}', 1, align="R", fill=True)
-            pdf.cell(25, 8, f'{product["total"]:.2f}', 1, align="R", fill=True)
-            pdf.ln()
+    pdf.set_invoice_font("", 8)
+    line_totals = template.render_product_table(pdf, iter_product_lines(invoice))
     pdf.ln(8)
-    pdf.set_fill_color(*pdf.LIGHT_GRAY)
-    pdf.rect(120, pdf.get_y(), 75, 35, 'F')
-    totals_y = pdf.get_y() + 5
-    pdf.set_xy(125, totals_y)
-    pdf.set_text_color(*pdf.DARK_GRAY)
+    template.continue_on_new_page(pdf, template.TOTALS_HEIGHT)
+    # Totalurile salvate au prioritate; lipsesc doar la facturi introduse incomplet
+    totals = [saved if saved is not None else computed for saved, computed in
+              zip((invoice.total_no_vat, invoice.total_vat, invoice.total_payment), line_totals)]
+    template.render_totals(pdf, pdf.get_y(), *totals, invoice.text('currency', 'RON'))
+
+
+def invoice_file_name(invoice):
+    invoice = Invoice.coerce(invoice)
+    safe_filename = invoice.text('invoice_number', 'UNKNOWN').replace("/", "_").replace("\\", "_")
+    return f"Invoice_{safe_filename}.pdf"
+
+
+def _render_document(invoice, user_settings=None):
+    """One invoice in its own document, with the reduced fonts unless it needs other characters"""
+    template = InvoiceTemplate.for_settings(user_settings)
+    pdf = ModernPDFInvoice(template=template)
+    render_invoice(pdf, invoice)
+    if pdf.has_missing_glyphs():
+        pdf = ModernPDFInvoice(template=template, full_fonts=True)
+        render_invoice(pdf, invoice)
+    return pdf
+
+
+def generate_invoice_bytes(invoice, user_settings=None):
+    """Render one invoice and return the PDF as bytes, without touching the disk"""
+    return bytes(_render_document(invoice, user_settings).output())
+
+
+def generate_invoice_pdf(invoice, user_settings=None):
+    invoice = Invoice.coerce(invoice)
+    pdf = _render_document(invoice, user_settings)
+    file_path = os.path.join(OUTPUT_DIR, invoice_file_name(invoice))
+    try:
+        pdf.output(file_path)
+        return file_path
+    except Exception as e:
+        print(f"Error saving PDF: {e}")
+        return None
+
+
+def _fingerprint_base(user_settings=None):
+    # Setările și versiunea template-ului sunt comune tuturor rândurilor: se hash-uiesc o singură dată
+    prefix = json.dumps([user_settings or {}, InvoiceTemplate.VERSION], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(prefix.encode("utf-8"))
+
+
+def invoice_fingerprint(invoice, user_settings=None, base=None):
+    """Hash of everything that affects the rendered PDF: the invoice, the settings and the template version"""
+    digest = (base or _fingerprint_base(user_settings)).copy()
+    # Valorile sunt deja normalizate de Invoice: "" și NaN sunt None, 100 și "100" sunt 100.0
+    row = json.dumps(Invoice.coerce(invoice).values(), ensure_ascii=False)
+    digest.update(row.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_manifest():
+    """Map of PDF file name -> {fingerprint, mtime_ns, size} of the file as it was written"""
+    path = os.path.join(OUTPUT_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
     try:
-        pdf.set_font("DejaVu", "", 10)
-    except:
-        pdf.set_font("Arial", "", 10)
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"⚠️ Error reading {MANIFEST_NAME}, all invoices will be regenerated: {e}")
+        return {}
+
+
+def save_manifest(files):
+    path = os.path.join(OUTPUT_DIR, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"files": files}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _manifest_entry(file_path, fingerprint):
+    stat = os.stat(file_path)
+    return {"fingerprint": fingerprint, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _index_generated(items):
+    """Add (path, invoice) pairs to the PDF index shown in the Invoices tab"""
+    # Indexul servește doar listei din interfață: o eroare aici nu oprește generarea,
+    # iar următoarea sincronizare cu directorul îl aduce la zi
     try:
-        subtotal = float(safe_get(row, 'Valoare totală fără TVA', '0'))
-        vat_total = float(safe_get(row, 'Total TVA', '0'))
-        total_payment = float(safe_get(row, 'Total plată', '0'))
-        currency = safe_get(row, 'Monedă', 'RON')
-    except (ValueError, TypeError):
-        subtotal = vat_total = total_payment = 0.0
-        currency = 'RON'
-    pdf.cell(65, 7, f"Subtotal: {subtotal:.2f} {currency}", align="R")
-    pdf.set_xy(125, totals_y + 8)
-    pdf.cell(65, 7, f"TVA: {vat_total:.2f} {currency}", align="R")
-    pdf.line(125, totals_y + 17, 190, totals_y + 17)
-    pdf.set_xy(120, totals_y + 20)
-    pdf.set_fill_color(*pdf.SUCCESS_GREEN)
-    pdf.set_text_color(*pdf.WHITE)
+        pdf_index.record_files(items)
+    except (OSError, sqlite3.Error) as e:
+        print(f"⚠️ Could not update the PDF index: {e}")
+
+
+def record_generated(results, fingerprints):
+    """Store the fingerprints of freshly written PDFs in the manifest"""
+    manifest = load_manifest()
+    for result in results:
+        if result.file_path and result.index in fingerprints:
+            name = os.path.basename(result.file_path)
+            manifest[name] = _manifest_entry(result.file_path, fingerprints[result.index])
+    save_manifest(manifest)
+
+
+def plan_regeneration(invoices, user_settings=None, manifest=None):
+    """Compare the invoices with the manifest and the files on disk.
+
+    A row is unchanged when its PDF exists, was rendered from the same fingerprint and
+    has not been rewritten since (same mtime and size); the rest are pending. stale
+    lists PDFs that exist but no longer match their row, orphaned lists PDFs in
+    OUTPUT_DIR that no invoice maps to.
+    """
+    manifest = load_manifest() if manifest is None else manifest
+    existing = {}
+    with os.scandir(OUTPUT_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith("Invoice_") and entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                existing[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    base = _fingerprint_base(user_settings)
+    pending, unchanged, stale, fingerprints, names = [], [], [], {}, set()
+    for position, invoice in enumerate(invoices_from(invoices)):
+        name = invoice_file_name(invoice)
+        fingerprint = invoice_fingerprint(invoice, base=base)
+        names.add(name)
+        entry = manifest.get(name) or {}
+        if name in existing and entry.get("fingerprint") == fingerprint \
+                and (entry.get("mtime_ns"), entry.get("size")) == existing[name]:
+            unchanged.append(os.path.join(OUTPUT_DIR, name))
+            continue
+        if name in existing:
+            stale.append(name)
+        fingerprints[position] = fingerprint
+        pending.append((position, invoice))
+    orphaned = sorted(existing.keys() - names)
+    return RegenerationPlan(pending, unchanged, stale, orphaned, fingerprints)
+
+
+def get_worker_count(user_settings=None):
+    """Number of worker processes from user_settings['generation']['workers'] (0 = all cores)"""
+    generation = (user_settings or {}).get('generation') or {}
+    value = generation.get('workers')
     try:
-        pdf.set_font("DejaVu", "B", 12)
-    except:
-        pdf.set_font("Arial", "B", 12)
-    pdf.cell(75, 10, f"TOTAL: {total_payment:.2f} {currency}", 1, align="C", fill=True)
-    pdf.set_xy(15, pdf.get_y() + 25)
-    pdf.set_text_color(*pdf.TEXT_GRAY)
+        # 0 e o valoare validă ("toate nucleele"); doar lipsa setării înseamnă 1
+        workers = 1 if value is None else int(value)
+    except (TypeError, ValueError):
+        workers = 1
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def _render_invoice(index, invoice, user_settings):
+    invoice_number = invoice.text('invoice_number')
+    start = time.perf_counter()
+    try:
+        file_path = generate_invoice_pdf(invoice, user_settings)
+        error = None if file_path else "PDF could not be saved"
+    except Exception as e:
+        file_path, error = None, str(e)
+    return InvoiceResult(index, invoice_number, file_path, error, time.perf_counter() - start)
+
+
+def _init_worker(user_settings):
+    global _worker_settings
+    _worker_settings = user_settings or {}
+    preload_fonts()
+
+
+def _render_in_worker(task):
+    index, invoice = task
+    return _render_invoice(index, invoice, _worker_settings)
+
+
+class CancellationToken:
+    """Cooperative cancellation flag shared between the caller and a running generation"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+def iter_generate_invoices(invoices, user_settings=None, workers=None, chunksize=None, cancel=None, progress=None):
+    """Render the invoices (DataFrame or list) and yield one InvoiceResult per invoice, in order.
+
+    Stops before the next invoice once cancel.cancelled is set; invoices a pool worker
+    has already started may still write their file but are not reported.
+    progress(done, total, result) is called after each invoice.
+    """
+    tasks = list(enumerate(invoices_from(invoices)))
+    if not tasks:
+        return
+    workers = workers or get_worker_count(user_settings)
+    total = len(tasks)
+    executor = None
+    if workers <= 1 or total == 1:
+        results = (_render_invoice(index, invoice, user_settings) for index, invoice in tasks)
+    else:
+        workers = min(workers, total)
+        # Bucăți suficient de mari cât să amortizeze transferul între procese, dar
+        # destul de mici (max 16) cât progresul să fie raportat des
+        chunksize = chunksize or max(1, min(16, total // (workers * 4)))
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT, initializer=_init_worker,
+                                       initargs=(user_settings,))
+        results = executor.map(_render_in_worker, tasks, chunksize=chunksize)
     try:
-        pdf.set_font("DejaVu", "I", 9)
-    except:
-        pdf.set_font("Arial", "I", 9)
-    pdf.cell(0, 5, "Vă mulțumim pentru colaborare și vă așteptăm din nou!", align="C")
-    safe_filename = str(safe_get(row, 'Număr factură', 'UNKNOWN')).replace("/", "_").replace("\\", "_")
-    file_path = os.path.join(OUTPUT_DIR, f"Invoice_{safe_filename}.pdf")
+        done = 0
+        for result in results:
+            done += 1
+            if progress is not None:
+                progress(done, total, result)
+            yield result
+            if cancel is not None and cancel.cancelled:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def generate_invoices_parallel(invoices, user_settings=None, workers=None, chunksize=None):
+    """Render every invoice in a process pool and return InvoiceResult objects in order"""
+    return list(iter_generate_invoices(invoices, user_settings, workers, chunksize))
+
+
+def generate_combined_pdf(invoices, user_settings=None, file_path=None, cancel=None, progress=None):
+    """Render every invoice into a single PDF and return InvoiceResult objects in order.
+
+    Fonts are embedded once for the whole batch; each invoice starts on its own page,
+    gets a bookmark and numbers its pages from 1. The file is written once at the end,
+    so results passed to progress() have no file_path yet and a cancelled batch
+    writes nothing.
+    """
+    invoices = invoices_from(invoices)
+    if not invoices:
+        return []
+    file_path = file_path or os.path.join(OUTPUT_DIR, f"Invoices_{datetime.now():%Y%m%d_%H%M%S}.pdf")
+    # Un singur document pentru tot lotul: fonturile se încarcă o dată, deci nu are rost varianta redusă
+    pdf = ModernPDFInvoice(template=InvoiceTemplate.for_settings(user_settings), full_fonts=True)
+    results = []
+    for index, invoice in enumerate(invoices):
+        if cancel is not None and cancel.cancelled:
+            return results
+        invoice_number = invoice.text('invoice_number')
+        start = time.perf_counter()
+        try:
+            render_invoice(pdf, invoice, bookmark=True)
+            error = None
+        except Exception as e:
+            error = str(e)
+        results.append(InvoiceResult(index, invoice_number, None, error, time.perf_counter() - start))
+        if progress is not None:
+            progress(index + 1, len(invoices), results[-1])
     try:
         pdf.output(file_path)
-        return file_path
     except Exception as e:
         print(f"Error saving PDF: {e}")
-        return None
+        return [r._replace(error=r.error or f"PDF could not be saved: {e}") for r in results]
+    return [r if r.error else r._replace(file_path=file_path) for r in results]
 
 
-def generate_all_invoices(df, user_settings=None):
+def generate_invoices_zip(invoices, target, user_settings=None, cancel=None, progress=None):
+    """Render every invoice straight into a ZIP archive and return InvoiceResult objects.
+
+    target is a path or a writable binary file object (it does not need to be seekable,
+    so an HTTP response works). Each PDF is rendered in memory and written to the archive
+    before the next one starts. invoices may be a generator (e.g. db_handler.iter_invoices)
+    and is read one invoice at a time, so only the InvoiceResult list grows with the batch.
+    PDFs are already compressed, so entries are stored rather than deflated. The
+    file_path of each result is the entry name inside the archive. progress(done, total,
+    result) gets total=None when invoices has no len().
+    """
+    results = []
+    total = len(invoices) if hasattr(invoices, "__len__") else None
+    invoices = iter_invoices_from(invoices)
+    first = next(invoices, None)
+    if first is None:
+        return results
+    used_names = set()
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_STORED) as archive:
+        for index, invoice in enumerate(itertools.chain((first,), invoices)):
+            if cancel is not None and cancel.cancelled:
+                break
+            invoice_number = invoice.text('invoice_number')
+            start = time.perf_counter()
+            name = invoice_file_name(invoice)
+            duplicate = 1
+            while name in used_names:
+                duplicate += 1
+                name = invoice_file_name(invoice)[:-len(".pdf")] + f"_{duplicate}.pdf"
+            try:
+                archive.writestr(name, generate_invoice_bytes(invoice, user_settings))
+                used_names.add(name)
+                result = InvoiceResult(index, invoice_number, name, None, time.perf_counter() - start)
+            except Exception as e:
+                result = InvoiceResult(index, invoice_number, None, str(e), time.perf_counter() - start)
+            results.append(result)
+            if progress is not None:
+                progress(index + 1, total, result)
+    return results
+
+
+def generate_all_invoices(invoices, user_settings=None, workers=None, single_file=False, incremental=False,
+                          cancel=None, progress=None):
     generated_files = []
-    if df is None or df.empty:
+    invoices = invoices_from(invoices)
+    if not invoices:
         print("No data to generate PDFs from")
         return generated_files
-    print(f"Starting PDF generation for {len(df)} invoices...")
-    for index, row in df.iterrows():
-        try:
-            file_path = generate_invoice_pdf(row, user_settings)
-            if file_path:
-                generated_files.append(file_path)
-                print(f"✅ Invoice {row.get('Număr factură', 'N/A')} generated: {os.path.basename(file_path)}")
-            else:
-                print(f"❌ Failed to generate invoice {row.get('Număr factură', 'N/A')}")
-        except Exception as e:
-            print(f"❌ Error generating invoice {row.get('Număr factură', 'N/A')}: {e}")
-    print(f"PDF generation complete: {len(generated_files)} files created")
+    if single_file:
+        print(f"Starting PDF generation for {len(invoices)} invoices into a single file...")
+        results = generate_combined_pdf(invoices, user_settings, cancel=cancel, progress=progress)
+        for result in results:
+            if result.error:
+                print(f"❌ Error generating invoice {result.invoice_number}: {result.error}")
+        generated_files = sorted({r.file_path for r in results if r.file_path})
+        _index_generated((path, None) for path in generated_files)
+        print(f"PDF generation complete: {len(results) - sum(1 for r in results if r.error)} invoices "
+              f"in {len(generated_files)} file(s)")
+        return generated_files
+    workers = workers or get_worker_count(user_settings)
+    if incremental:
+        plan = plan_regeneration(invoices, user_settings)
+        generated_files.extend(plan.unchanged)
+        print(f"{len(plan.unchanged)} invoices up to date, {len(plan.stale)} stale, "
+              f"{len(plan.pending) - len(plan.stale)} new, {len(plan.orphaned)} orphaned PDF(s)")
+        fingerprints = {i: plan.fingerprints[position] for i, (position, _) in enumerate(plan.pending)}
+        invoices = [invoice for _, invoice in plan.pending]
+        if not invoices:
+            print("PDF generation complete: nothing to regenerate")
+            return generated_files
+    else:
+        base = _fingerprint_base(user_settings)
+        fingerprints = {i: invoice_fingerprint(invoice, base=base) for i, invoice in enumerate(invoices)}
+    print(f"Starting PDF generation for {len(invoices)} invoices ({workers} worker(s))...")
+    results = []
+    created = 0
+    for result in iter_generate_invoices(invoices, user_settings, workers, cancel=cancel, progress=progress):
+        results.append(result)
+        if result.file_path:
+            generated_files.append(result.file_path)
+            created += 1
+            _index_generated([(result.file_path, invoices[result.index])])
+            print(f"✅ Invoice {result.invoice_number} generated: {os.path.basename(result.file_path)}")
+        else:
+            print(f"❌ Error generating invoice {result.invoice_number}: {result.error}")
+    record_generated(results, fingerprints)
+    if len(results) < len(invoices):
+        print(f"PDF generation cancelled after {len(results)} of {len(invoices)} invoices")
+    print(f"PDF generation complete: {created} files created")
     return generated_files
 
 
 def generate_invoice_from_dict(row_dict, user_settings=None):
     if not isinstance(row_dict, dict):
         raise ValueError("Expected dict for invoice row")
-    row = pd.Series(row_dict)
-    return generate_invoice_pdf(row, user_settings)
+    return generate_invoice_pdf(Invoice.from_dict(row_dict), user_settings)
 
 
 if __name__ == "__main__":
+    import argparse
     from core import db_handler
-    df = db_handler.get_all_invoices()
-    if df is not None and not df.empty:
-        print(f"\nGenerating PDFs for {len(df)} invoices from database...")
+    parser = argparse.ArgumentParser(description="Generate invoice PDFs from the database")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (0 = all cores, default from user_settings.json)")
+    parser.add_argument("--single-file", action="store_true",
+                        help="write all invoices into one combined PDF")
+    parser.add_argument("--zip", metavar="PATH",
+                        help="write all invoices into a ZIP archive instead of OUTPUT_DIR")
+    parser.add_argument("--force", action="store_true",
+                        help="re-render every invoice even if its PDF is up to date")
+    args = parser.parse_args()
+    count = db_handler.count_invoices()
+    if count:
+        print(f"\nGenerating PDFs for {count} invoices from database...")
         user_settings = load_user_settings()
-        generated_files = generate_all_invoices(df, user_settings)
-        print(f"\n✅ {len(generated_files)} invoices generated successfully!")
+    if count and args.zip:
+        # Facturile se citesc pagină cu pagină pe măsură ce intră în arhivă, nu toate dinainte
+        results = generate_invoices_zip(db_handler.iter_invoices(with_lines=True), args.zip, user_settings)
+        for result in results:
+            if result.error:
+                print(f"❌ Error generating invoice {result.invoice_number}: {result.error}")
+        print(f"\n✅ {sum(1 for r in results if not r.error)} invoices written to {args.zip}")
+    elif count:
+        invoices = list(db_handler.iter_invoices(with_lines=True))
+        workers = get_worker_count({'generation': {'workers': args.workers}}) if args.workers is not None else None
+        generated_files = generate_all_invoices(invoices, user_settings, workers, single_file=args.single_file,
+                                                incremental=not args.force)
+        print(f"\n✅ {len(generated_files)} PDF file(s) generated successfully!")
         print(f"PDFs saved in: {OUTPUT_DIR}")
     else:
         print("No invoices found in database. Add some invoices first.")
@@ -0,0 +1,99 @@
+"""Index of the generated PDFs in OUTPUT_DIR, kept in the pdf_file table.
+
+The Invoices tab pages through the index instead of listing the directory, so
+opening it is one indexed query however many files there are. The generator
+records every PDF as soon as it is written (record_files); sync() catches up
+with changes made outside the application by comparing each file's size and
+mtime with the index, and runs when the directory watcher reports a change.
+
+    python -m core.pdf_index
+"""
+import os
+from collections import namedtuple
+
+from core import db_handler
+
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "output_pdfs")
+INVOICE_PREFIX = "Invoice_"
+
+# Câte fișiere a adăugat, actualizat și scos din index o sincronizare
+SyncReport = namedtuple("SyncReport", "added updated removed")
+
+
+def is_pdf(file_name):
+    return file_name.lower().endswith(".pdf")
+
+
+def invoice_number_from_name(file_name):
+    """The number in an "Invoice_<number>.pdf" name, or None (e.g. a combined PDF).
+
+    "/" and "\\" in invoice numbers become "_" in file names, so such numbers
+    come back altered; the generator records the real number itself.
+    """
+    if file_name.startswith(INVOICE_PREFIX) and is_pdf(file_name):
+        return file_name[len(INVOICE_PREFIX):-len(".pdf")] or None
+    return None
+
+
+def _with_details(entries):
+    # Fișierele fără factură cunoscută primesc cumpărătorul și data după numărul din nume
+    numbers = {entry[0]: invoice_number_from_name(entry[0]) for entry in entries if entry[1] is None}
+    details = db_handler.find_invoice_details(number for number in numbers.values() if number)
+    completed = []
+    for entry in entries:
+        number = numbers.get(entry[0])
+        if number is not None:
+            entry = (entry[0], number, *details.get(number, (None, None))) + entry[4:]
+        completed.append(entry)
+    return completed
+
+
+def record_files(items):
+    """Add or refresh (path, invoice) pairs in the index; returns how many were recorded.
+
+    invoice (an Invoice) gives the number, buyer and date shown in the list; with
+    None they are looked up by the invoice number in the file name.
+    """
+    entries = []
+    for path, invoice in items:
+        stat = os.stat(path)
+        if invoice is None:
+            details = (None, None, None)
+        else:
+            details = (invoice.invoice_number, invoice.buyer_name, invoice.issue_date)
+        entries.append((os.path.basename(path), *details, stat.st_size, stat.st_mtime_ns))
+    return db_handler.record_pdf_files(_with_details(entries))
+
+
+def scan(directory=OUTPUT_DIR):
+    """{file_name: (size, mtime_ns)} of the PDFs in directory"""
+    files = {}
+    if not os.path.isdir(directory):
+        return files
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if is_pdf(entry.name) and entry.is_file():
+                stat = entry.stat()
+                files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def sync(directory=OUTPUT_DIR):
+    """Bring the index in line with the PDFs in directory; returns SyncReport.
+
+    Only files that are new or whose size or mtime changed are written.
+    """
+    on_disk = scan(directory)
+    indexed = db_handler.get_pdf_file_state()
+    changed = [(name, state) for name, state in on_disk.items() if indexed.get(name) != state]
+    removed = indexed.keys() - on_disk.keys()
+    db_handler.record_pdf_files(_with_details([(name, None, None, None, *state) for name, state in changed]))
+    db_handler.remove_pdf_files(removed)
+    added = sum(1 for name, _ in changed if name not in indexed)
+    return SyncReport(added, len(changed) - added, len(removed))
+
+
+if __name__ == "__main__":
+    db_handler.create_db()
+    report = sync()
+    print(f"✅ PDF index up to date: {report.added} added, {report.updated} updated, {report.removed} removed")
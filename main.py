@@ -1,22 +1,84 @@
+import time
+_START = time.perf_counter()
+
 import sys
 import os
-from PySide6.QtWidgets import QApplication
+import contextlib
+
+PROFILE_FLAG = "--profile-startup"
+# Module grele care ar trebui să lipsească la pornire (se importă la prima folosire)
+DEFERRED_MODULES = ("pandas", "matplotlib", "fpdf", "pyarrow", "UI.table_window")
+
+
+class StartupProfile:
+    """Times startup steps for --profile-startup and prints them when the first frame is shown.
+
+    Each step reports its wall time and how many modules it imported. Steps that run
+    later (tabs built on their first visit) are printed as they happen.
+    """
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.steps = []
+        self.reported = False
+
+    @contextlib.contextmanager
+    def step(self, name):
+        if not self.enabled:
+            yield
+            return
+        modules = len(sys.modules)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            step = (name, time.perf_counter() - start, len(sys.modules) - modules)
+            if self.reported:
+                self._print_step(*step)
+            else:
+                self.steps.append(step)
+
+    @staticmethod
+    def _print_step(name, seconds, modules):
+        print(f"  {name:<28} {seconds * 1000:9.1f} ms  {modules:5d} modules imported")
+
+    def report(self):
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        print(f"\nStartup profile: first frame after {(time.perf_counter() - _START) * 1000:.1f} ms")
+        for step in self.steps:
+            self._print_step(*step)
+        loaded = [name for name in DEFERRED_MODULES if name in sys.modules]
+        print(f"  deferred modules already loaded: {', '.join(loaded) or 'none'}")
+        print("Tabs are built on their first visit:")
+
 
 def main():
+    profile = StartupProfile(PROFILE_FLAG in sys.argv)
+    if profile.enabled:
+        sys.argv.remove(PROFILE_FLAG)
     os.environ['QT_QPA_PLATFORM'] = 'xcb'
     try:
-        app = QApplication(sys.argv)
+        with profile.step("import PySide6"):
+            from PySide6.QtCore import QTimer
+            from PySide6.QtWidgets import QApplication
+        with profile.step("QApplication"):
+            app = QApplication(sys.argv)
         styles_path = "UI/styles.qss"
         if os.path.exists(styles_path):
-            with open(styles_path, "r") as f:
+            with profile.step("stylesheet"), open(styles_path, "r") as f:
                 app.setStyleSheet(f.read())
         else:
             print(f"\nStyle file not found: {styles_path}")
             print("Continuing without custom styles...")
         try:
-            from UI.main_window import MainWindow
-            win = MainWindow()
-            win.show()
+            with profile.step("import UI.main_window"):
+                from UI.main_window import MainWindow
+            with profile.step("MainWindow()"):
+                win = MainWindow(profile_step=profile.step)
+            with profile.step("show"):
+                win.show()
         except ImportError as e:
             print(f"\nError importing MainWindow: {e}")
             print("Make sure the UI module exists and is properly configured.")
@@ -24,6 +86,8 @@ def main():
         except Exception as e:
             print(f"Error creating main window: {e}")
             return
+        # Rulează după primul ciclu al buclei de evenimente, adică după ce fereastra a fost desenată
+        QTimer.singleShot(0, profile.report)
         sys.exit(app.exec())
     except Exception as e:
         print(f"\n Error starting application: {e}")
@@ -0,0 +1,285 @@
+"""Benchmark pentru generarea facturilor PDF.
+
+Rulează sarcini sintetice reproductibile (1, 100 și 10.000 de facturi, cu număr
+variabil de linii de produs) și raportează facturi/secundă, latența p50/p99 per
+factură, octeți per PDF și memoria maximă (peak RSS). Rezultatele se salvează în
+JSON și pot fi comparate între rulări:
+
+    python scripts/benchmark.py
+    python scripts/benchmark.py --sizes 1,100 --profiles small,large --mode combined
+    python scripts/benchmark.py --compare data/benchmarks/before.json data/benchmarks/after.json
+
+Fiecare sarcină rulează într-un proces separat, astfel încât peak RSS să nu fie
+influențat de sarcinile anterioare.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+
+# adaugăm corect calea ca să meargă importul chiar dacă rulăm din scripts/
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+RESULTS_DIR = os.path.join(ROOT_DIR, "data", "benchmarks")
+DEFAULT_SIZES = (1, 100, 10000)
+# (minim, maxim) linii de produs per factură
+LINE_PROFILES = {
+    "small": (1, 3),
+    "medium": (4, 15),
+    "large": (16, 40),
+    "mixed": (1, 40),
+}
+MODES = ("bytes", "combined", "zip")
+# metrici afișate la comparare: (cheie, True dacă o valoare mai mare e mai bună)
+COMPARED_METRICS = (
+    ("invoices_per_second", True),
+    ("latency_p50_ms", False),
+    ("latency_p99_ms", False),
+    ("bytes_per_pdf", False),
+    ("peak_rss_mb", False),
+)
+BENCHMARK_SETTINGS = {
+    "company": {"name": "BENCHMARK SRL"},
+    "seller": {
+        "name": "Benchmark SRL", "legal_id": "J40/1234/2020", "vat": "RO12345678",
+        "street": "Str. Exemplu 1", "city": "București", "county": "București", "country": "România",
+    },
+}
+
+
+def synthetic_invoices(count, profile, seed=0):
+    """The same list of Invoice objects for the same (count, profile, seed)"""
+    from core.invoice_record import Invoice
+    rng = random.Random(f"{seed}-{count}-{profile}")
+    low, high = LINE_PROFILES[profile]
+    invoices = []
+    for n in range(count):
+        lines = []
+        subtotal = vat_total = 0.0
+        for j in range(rng.randint(low, high)):
+            quantity = rng.randint(1, 20)
+            price = round(rng.uniform(5, 500), 2)
+            vat_rate = rng.choice((5, 9, 19))
+            subtotal += quantity * price
+            vat_total += quantity * price * vat_rate / 100
+            lines.append(f"Produs {j + 1} {rng.choice(('Standard', 'Premium', 'Eco'))}|{quantity}|{price}|{vat_rate}")
+        invoices.append(Invoice(
+            invoice_number=f"BENCH{n + 1:06d}",
+            issue_date=f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            invoice_type="Factura",
+            currency=rng.choice(("RON", "EUR", "USD")),
+            buyer_name=rng.choice(("Client SRL", "Firma X", "Compania Y", "Partener Z")),
+            buyer_legal_id=f"J{rng.randint(100, 999)}/2025",
+            buyer_vat_id=f"RO{rng.randint(100000, 999999)}",
+            buyer_street=rng.choice(("Str. Libertății 10", "Bd. Unirii 5", "Calea Victoriei 20")),
+            buyer_city=rng.choice(("București", "Cluj", "Timișoara", "Iași")),
+            buyer_county=rng.choice(("Ilfov", "Cluj", "Timiș", "Iași")),
+            buyer_postal_code=str(rng.randint(100000, 999999)),
+            buyer_country="România",
+            payment_terms=rng.choice(("15 zile", "30 zile", "60 zile")),
+            invoice_lines=";".join(lines),
+            total_no_vat=round(subtotal, 2),
+            total_vat=round(vat_total, 2),
+            total_payment=round(subtotal + vat_total, 2),
+        ))
+    return invoices
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None if the platform can't tell"""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux raportează KiB, macOS octeți
+        return peak if sys.platform == "darwin" else peak * 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return getattr(psutil.Process().memory_info(), "peak_wset", None)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def run_workload(count, profile, mode, seed=0):
+    """Render one workload in this process and return its metrics as a dict"""
+    from core import pdf_generator
+
+    start = time.perf_counter()
+    invoices = synthetic_invoices(count, profile, seed)
+    pdf_generator.preload_fonts()
+    setup_seconds = time.perf_counter() - start
+
+    latencies = []
+    errors = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        if mode == "bytes":
+            total_bytes = 0
+            for invoice in invoices:
+                started = time.perf_counter()
+                total_bytes += len(pdf_generator.generate_invoice_bytes(invoice, BENCHMARK_SETTINGS))
+                latencies.append(time.perf_counter() - started)
+            pdf_count = len(invoices)
+        elif mode == "combined":
+            target = os.path.join(tmp, "combined.pdf")
+            results = pdf_generator.generate_combined_pdf(invoices, BENCHMARK_SETTINGS, file_path=target)
+            latencies = [result.elapsed for result in results]
+            errors = sum(1 for result in results if result.error)
+            total_bytes = os.path.getsize(target) if os.path.exists(target) else 0
+            pdf_count = 1
+        else:
+            target = os.path.join(tmp, "invoices.zip")
+            results = pdf_generator.generate_invoices_zip(invoices, target, BENCHMARK_SETTINGS)
+            latencies = [result.elapsed for result in results]
+            errors = sum(1 for result in results if result.error)
+            with zipfile.ZipFile(target) as archive:
+                total_bytes = sum(info.file_size for info in archive.infolist())
+            pdf_count = len(invoices) - errors
+        elapsed = time.perf_counter() - start
+
+    peak = peak_rss_bytes()
+    return {
+        "name": f"{mode}-{profile}-{count}",
+        "mode": mode,
+        "profile": profile,
+        "invoices": count,
+        "product_lines": sum(invoice.invoice_lines.count(";") + 1 for invoice in invoices),
+        "errors": errors,
+        "setup_seconds": round(setup_seconds, 4),
+        "elapsed_seconds": round(elapsed, 4),
+        "invoices_per_second": round(count / elapsed, 3) if elapsed else None,
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        "latency_p99_ms": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        "latency_max_ms": round(max(latencies) * 1000, 3) if latencies else None,
+        "pdf_files": pdf_count,
+        "total_bytes": total_bytes,
+        "bytes_per_pdf": round(total_bytes / pdf_count) if pdf_count else None,
+        "bytes_per_invoice": round(total_bytes / count),
+        "peak_rss_mb": round(peak / (1024 * 1024), 1) if peak is not None else None,
+    }
+
+
+def run_isolated(count, profile, mode, seed=0):
+    """Run one workload in a fresh interpreter so its peak RSS is its own"""
+    with tempfile.TemporaryDirectory() as tmp:
+        result_path = os.path.join(tmp, "result.json")
+        command = [
+            sys.executable, os.path.abspath(__file__), "--run-one", result_path,
+            "--sizes", str(count), "--profiles", profile, "--mode", mode, "--seed", str(seed),
+        ]
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        with open(result_path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def git_revision():
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def run_suite(sizes, profiles, mode, seed=0):
+    import fpdf
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "fpdf2": getattr(fpdf, "__version__", None),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+        "workloads": [],
+    }
+    for profile in profiles:
+        for count in sizes:
+            print(f"▶ {mode}-{profile}-{count} ...", flush=True)
+            workload = run_isolated(count, profile, mode, seed)
+            results["workloads"].append(workload)
+            print(f"  {workload['invoices_per_second']} facturi/s, "
+                  f"p50 {workload['latency_p50_ms']} ms, p99 {workload['latency_p99_ms']} ms, "
+                  f"{workload['bytes_per_pdf']} B/PDF, peak RSS {workload['peak_rss_mb']} MB")
+    return results
+
+
+def save_results(results, path=None):
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def compare_results(base, new):
+    """Print every metric of the workloads present in both result files, with the change in %"""
+    base_workloads = {workload["name"]: workload for workload in base["workloads"]}
+    print(f"{'workload':<24} {'metric':<20} {'base':>12} {'new':>12} {'change':>9}")
+    for workload in new["workloads"]:
+        previous = base_workloads.get(workload["name"])
+        if previous is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            old_value, new_value = previous.get(metric), workload.get(metric)
+            if old_value is None or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            improved = change > 0 if higher_is_better else change < 0
+            marker = "" if abs(change) < 1 else (" ✅" if improved else " ❌")
+            print(f"{workload['name']:<24} {metric:<20} {old_value:>12} {new_value:>12} {change:>+8.1f}%{marker}")
+
+
+def _csv(value, kind=str):
+    return [kind(part) for part in value.split(",") if part.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark invoice PDF generation")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma separated invoice counts (default 1,100,10000)")
+    parser.add_argument("--profiles", default="mixed",
+                        help=f"comma separated product-line profiles: {', '.join(LINE_PROFILES)}")
+    parser.add_argument("--mode", choices=MODES, default="bytes",
+                        help="bytes = one in-memory PDF per invoice, combined = one PDF, zip = ZIP archive")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="result file (default data/benchmarks/bench_<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files")
+    parser.add_argument("--run-one", metavar="RESULT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            base_results = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f:
+            new_results = json.load(f)
+        compare_results(base_results, new_results)
+    elif args.run_one:
+        workload = run_workload(_csv(args.sizes, int)[0], args.profiles, args.mode, args.seed)
+        with open(args.run_one, "w", encoding="utf-8") as f:
+            json.dump(workload, f)
+    else:
+        unknown = [profile for profile in _csv(args.profiles) if profile not in LINE_PROFILES]
+        if unknown:
+            parser.error(f"unknown profile(s): {', '.join(unknown)}")
+        suite = run_suite(_csv(args.sizes, int), _csv(args.profiles), args.mode, args.seed)
+        print(f"\nRezultate salvate în: {save_results(suite, args.output)}")
@@ -0,0 +1,104 @@
+"""Verifică planurile de execuție ale interogărilor din core/db_handler.py.
+
+Rulează fiecare funcție din db_handler pe o bază de date temporară populată cu
+facturi sintetice, capturează instrucțiunile SQL executate și rulează
+EXPLAIN QUERY PLAN pe fiecare. Scriptul se termină cu cod 1 dacă vreo
+interogare parcurge un tabel întreg fără index (full scan).
+
+    python scripts/check_query_plans.py
+"""
+import os
+import re
+import sys
+import tempfile
+
+# adaugăm corect calea ca să meargă importul chiar dacă rulăm din scripts/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core import db_handler, migrations
+from db_population import generate_random_invoice
+
+SEED_INVOICES = 2000
+# "SCAN invoices" fără "USING ... INDEX" = citirea întregului tabel (subinterogările materializate nu contează)
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+CHECKED_STATEMENTS = ("SELECT", "UPDATE", "DELETE", "WITH")
+# Tabelele de sumar au un rând pe lună / pe cumpărător: citirea lor integrală e chiar scopul lor.
+# invoice_number_rename are doar numerele duplicate redenumite o dată, la trecerea la numere unice
+SMALL_TABLES = set(migrations.SUMMARY_TABLES) | {"invoice_number_rename"}
+
+
+def exercised_calls():
+    """(name, callable) for every db_handler function whose queries are checked"""
+    return [
+        ("get_invoices_page", db_handler.get_invoices_page),
+        ("get_invoices_page filtered", lambda: db_handler.get_invoices_page(
+            {"date_from": "2025-01-01", "date_to": "2025-06-30", "currency": "RON"}, after_key=("2025-03-01", 500))),
+        *[(f"get_invoices_page order={order}", lambda order=order: db_handler.get_invoices_page(
+            order=order, after_key=(None if order.lstrip("-") == "buyer_name" else "x", 100), limit=50))
+          for order in ("id", "-id", "issue_date", "invoice_number", "-invoice_number", "buyer_name", "-buyer_name")],
+        ("get_invoices_page buyer", lambda: db_handler.get_invoices_page({"buyer": "Firma X"}, order="buyer_name",
+                                                                         after_key=("Firma X", 10))),
+        ("get_invoices_page offset", lambda: db_handler.get_invoices_page(after_key=("2025-03-01", 500), offset=400)),
+        ("count_invoices", db_handler.count_invoices),
+        ("count_invoices filtered", lambda: db_handler.count_invoices({"buyer": "Firma X"})),
+        ("search_invoices", lambda: db_handler.search_invoices("client cluj")),
+        ("get_invoice_stats", db_handler.get_invoice_stats),
+        ("get_product_stats", db_handler.get_product_stats),
+        ("get_invoice_lines", lambda: db_handler.get_invoice_lines(range(1, 600))),
+        ("load_invoice_lines", lambda: db_handler.load_invoice_lines([(3, [("Produs1", 2, 100, 19)])])),
+        ("update_invoice", lambda: db_handler.update_invoice(1, {"Total TVA": 0})),
+        ("update_invoice lines", lambda: db_handler.update_invoice(4, {"Linii factură (produse)": "A|1|10|19"})),
+        ("delete_invoice", lambda: db_handler.delete_invoice(2)),
+        ("record_pdf_files", lambda: db_handler.record_pdf_files([("Invoice_INV1.pdf", "INV1", None, None, 10, 1)])),
+        ("count_pdf_files", db_handler.count_pdf_files),
+        ("count_pdf_files filtered", lambda: db_handler.count_pdf_files("inv1")),
+        *[(f"get_pdf_files_page order={order}", lambda order=order: db_handler.get_pdf_files_page(
+            order=order, after_key=(None if order.lstrip("-") in db_handler.PDF_NULLABLE_ORDER_COLUMNS else 5, 100)))
+          for order in db_handler.PDF_ORDER_COLUMNS + ("-mtime_ns", "-buyer_name")],
+        ("get_pdf_files_page filtered", lambda: db_handler.get_pdf_files_page("firma", offset=200)),
+        ("find_invoice_details", lambda: db_handler.find_invoice_details(f"INV{n}" for n in range(600))),
+        ("remove_pdf_files", lambda: db_handler.remove_pdf_files(["Invoice_INV1.pdf"])),
+        ("get_unacknowledged_renames", db_handler.get_unacknowledged_renames),
+        ("acknowledge_renames", lambda: db_handler.acknowledge_renames([1, 2])),
+    ]
+
+
+def capture_statements(conn, call):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        conn.set_trace_callback(None)
+    return [sql for sql in statements if sql.lstrip().split(None, 1)[0].upper() in CHECKED_STATEMENTS]
+
+
+def check_query_plans():
+    """Print the plan of every captured statement; returns the list of full scans found"""
+    conn = db_handler.get_connection()
+    tables = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")} - SMALL_TABLES
+    full_scans = []
+    for name, call in exercised_calls():
+        print(f"▶ {name}")
+        for sql in capture_statements(conn, call):
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+            scans = [detail for detail in plan if (match := FULL_SCAN.match(detail)) and match.group(1) in tables]
+            marker = "❌" if scans else "✅"
+            print(f"  {marker} {' '.join(sql.split())[:100]}")
+            for detail in plan:
+                print(f"       {detail}")
+            full_scans.extend((name, sql, detail) for detail in scans)
+    return full_scans
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        db_handler.DB_PATH = os.path.join(tmp, "query_plans.db")
+        db_handler.insert_invoices(generate_random_invoice(n) for n in range(SEED_INVOICES))
+        problems = check_query_plans()
+        db_handler.close_all_connections()
+    if problems:
+        print(f"\n❌ {len(problems)} full table scan(s):")
+        for name, sql, detail in problems:
+            print(f"  {name}: {detail}  <- {' '.join(sql.split())[:80]}")
+        sys.exit(1)
+    print("\n✅ No query falls back to a full table scan")
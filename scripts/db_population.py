@@ -5,18 +5,25 @@ import sys, os
 # adaugăm corect calea ca să meargă importul chiar dacă rulăm din scripts/
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from core import db_handler
+from core.invoice_record import format_product_lines
+
+# Cotele de TVA din România
+VAT_RATES = (19, 9, 5)
 
 def clear_database():
     """Șterge toate facturile existente din baza de date"""
-    import sqlite3
-    conn = sqlite3.connect(db_handler.DB_PATH)
-    c = conn.cursor()
-    c.execute("DELETE FROM invoices")
-    conn.commit()
-    conn.close()
+    conn = db_handler.get_connection()
+    with conn:
+        conn.execute("DELETE FROM invoices")
     print("⚠️  Toate facturile existente au fost șterse.")
 
 def generate_random_invoice(n):
+    products = [
+        (f"Produs{j}", random.randint(1, 5), random.randint(50, 500), random.choice(VAT_RATES))
+        for j in range(random.randint(1, 5))
+    ]
+    total_no_vat = sum(quantity * price for _, quantity, price, _ in products)
+    total_vat = sum(quantity * price * vat / 100 for _, quantity, price, vat in products)
     return {
         "Număr factură": f"INV{1000+n}",
         "Data emiterii": (datetime.date.today() - datetime.timedelta(days=random.randint(0, 365))).isoformat(),
@@ -31,22 +38,21 @@ def generate_random_invoice(n):
         "Cod poștal cumpărător": str(random.randint(100000, 999999)),
         "Țară cumpărător": "România",
         "Termeni plată": random.choice(["15 zile", "30 zile", "60 zile"]),
-        "Linii factură (produse)": "; ".join([
-            f"Produs{j} x{random.randint(1,5)} @ {random.randint(50,500)} RON"
-            for j in range(random.randint(1, 5))
-        ]),
-        "Valoare totală fără TVA": round(random.uniform(500, 5000), 2),
-        "Total TVA": round(random.uniform(100, 1000), 2),
+        "Linii factură (produse)": format_product_lines(products),
+        "Valoare totală fără TVA": round(total_no_vat, 2),
+        "Total TVA": round(total_vat, 2),
         "Total plată": 0.0  # calculăm după
     }
 
 def populate_db(num_invoices=100):
     clear_database()
+    invoices = []
     for i in range(num_invoices):
         invoice = generate_random_invoice(i)
         invoice["Total plată"] = round(invoice["Valoare totală fără TVA"] + invoice["Total TVA"], 2)
-        db_handler.insert_invoice(invoice)
-    print(f"✅ {num_invoices} facturi generate și salvate în baza de date.")
+        invoices.append(invoice)
+    report = db_handler.insert_invoices(invoices)
+    print(f"✅ {report.inserted} facturi generate și salvate în baza de date.")
 
 if __name__ == "__main__":
     populate_db(100)
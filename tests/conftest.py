@@ -0,0 +1,14 @@
+import os
+
+import pytest
+
+from core import db_handler
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point db_handler at a fresh database for the duration of a test"""
+    monkeypatch.setattr(db_handler, "DB_PATH", os.path.join(tmp_path, "invoices.db"))
+    db_handler.create_db()
+    yield db_handler.get_connection()
+    db_handler.close_all_connections()
@@ -0,0 +1,24 @@
+from itertools import islice
+
+import pytest
+
+from core import db_handler
+
+
+def _insert(conn, rows):
+    # Direct în tabel, cu "" ca în bazele salvate de interfața veche
+    with conn:
+        conn.executemany("INSERT INTO invoices (invoice_number, issue_date, buyer_name) VALUES (?, ?, ?)", rows)
+    db_handler._note_write()
+
+
+@pytest.mark.parametrize("order", ["-issue_date", "issue_date", "-buyer_name", "buyer_name",
+                                   "invoice_number", "-invoice_number"])
+def test_iter_invoices_pages_through_empty_strings(temp_db, order):
+    rows = [(f"F{n}", "" if n % 3 == 0 else f"2024-01-{n + 1:02d}", "" if n % 5 == 0 else f"Buyer {n % 4}")
+            for n in range(15)]
+    rows += [("", "", None)]
+    _insert(temp_db, rows)
+    # islice: o cheie greșită poate repeta la nesfârșit aceleași pagini
+    ids = [invoice.id for invoice in islice(db_handler.iter_invoices(order=order, page_size=3), 2 * len(rows))]
+    assert sorted(ids) == list(range(1, len(rows) + 1))
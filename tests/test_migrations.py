@@ -0,0 +1,35 @@
+import sqlite3
+
+from core import db_handler, migrations
+
+
+def _database_at_version_1(path, numbers):
+    conn = sqlite3.connect(path)
+    for step in migrations.MIGRATIONS[0][1]:
+        step(conn)
+    conn.execute("PRAGMA user_version = 1")
+    conn.executemany("INSERT INTO invoices (invoice_number, issue_date) VALUES (?, '2024-01-01')",
+                     [(number,) for number in numbers])
+    conn.commit()
+    return conn
+
+
+def test_duplicate_numbers_are_renamed_and_recorded(tmp_path, monkeypatch):
+    path = str(tmp_path / "invoices.db")
+    _database_at_version_1(path, ["A1", "A1", "", "", "B2", ""]).close()
+    monkeypatch.setattr(db_handler, "DB_PATH", path)
+    try:
+        conn = db_handler.get_connection()
+        numbers = [number for number, in conn.execute("SELECT invoice_number FROM invoices ORDER BY id")]
+        assert numbers == ["A1", "A1 (2)", "", "(4)", "B2", "(6)"]
+        renames = db_handler.get_unacknowledged_renames()
+        assert renames == [(2, "A1", "A1 (2)"), (4, "", "(4)"), (6, "", "(6)")]
+        db_handler.acknowledge_renames(rename.invoice_id for rename in renames)
+        assert db_handler.get_unacknowledged_renames() == []
+    finally:
+        db_handler.close_all_connections()
+
+
+def test_fresh_database_has_no_renames(temp_db):
+    assert db_handler.get_unacknowledged_renames() == []
+    assert migrations.schema_version(temp_db) == migrations.SCHEMA_VERSION
@@ -0,0 +1,17 @@
+import os
+
+from core.pdf_generator import get_worker_count
+
+
+def test_zero_workers_means_all_cores():
+    assert get_worker_count({'generation': {'workers': 0}}) == (os.cpu_count() or 1)
+
+
+def test_missing_or_invalid_workers_default_to_one():
+    assert get_worker_count(None) == 1
+    assert get_worker_count({'generation': {}}) == 1
+    assert get_worker_count({'generation': {'workers': 'abc'}}) == 1
+
+
+def test_explicit_worker_count_is_kept():
+    assert get_worker_count({'generation': {'workers': 3}}) == 3
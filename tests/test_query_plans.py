@@ -0,0 +1,13 @@
+import os
+import sys
+
+from core import db_handler
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+from check_query_plans import SEED_INVOICES, check_query_plans  # noqa: E402
+from db_population import generate_random_invoice  # noqa: E402
+
+
+def test_no_query_scans_a_whole_table(temp_db):
+    db_handler.insert_invoices(generate_random_invoice(n) for n in range(SEED_INVOICES))
+    assert check_query_plans() == []